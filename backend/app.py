@@ -1,75 +1,46 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, current_app, g, request, jsonify
 from flask_cors import CORS
-import pandas as pd
-import numpy as np
-from random import uniform as rnd
-from sklearn.neighbors import NearestNeighbors
-from sklearn.preprocessing import StandardScaler
+import hmac
+import logging
 import os
+from concurrent.futures import TimeoutError as RequestTimeout
+import threading
+import time
+import numpy as np
+from python import metrics
+from python.app_logging import configure_logging
+from python.catalog import catalog_watcher
 from python.customized_recommendation_system import Recommendation
+from python.json_provider import FastJSONProvider
+from python.meal_plans import plan_meals
+from python.population import activity_levels
+from python.recommendation_engine import engine_generation, engine_ready, get_engine, load_error
+from python.request_schema import (MAX_CURSOR_RESULTS, ValidationError, batch_schema, custom_cursor_schema, custom_next_page_schema,
+                                   custom_schema, encode_cursor, meal_plan_schema, nutrition_schema)
+from python.response_cache import response_cache
+from python.serving import Overloaded, coalescer, micro_batcher, work_pool
+from python import target_profiles
+from python.target_profiles import build_target_nutrition
 
-app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
-
-# Load Dataset with better error handling
-print("\n===== LOADING RECIPE DATASET =====")
-df = None
-try:
-    # Get the current directory
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    # Construct paths relative to the current directory
-    possible_paths = [
-        os.path.join(current_dir, "datasets", "recipes.csv"),
-        os.path.join(current_dir, "..", "datasets", "recipes.csv"),
-        os.path.join(current_dir, "..", "..", "datasets", "recipes.csv")
-    ]
-    
-    for path in possible_paths:
-        try:
-            print(f"Attempting to load recipes from: {path}")
-            df = pd.read_csv(path)
-            print(f"Successfully loaded {len(df)} recipes from {path}")
-            break
-        except FileNotFoundError:
-            print(f"File not found at {path}")
-        except Exception as e:
-            print(f"Error loading {path}: {str(e)}")
-    
-    if df is None:
-        raise FileNotFoundError("Could not find recipes.csv in any of the expected locations")
-    
-    # Check loaded data
-    print(f"Dataset shape: {df.shape}")
-    print(f"Dataset columns: {df.columns.tolist()}")
-    
-except Exception as e:
-    print(f"Error loading dataset: {str(e)}")
-    # Create an empty DataFrame with required columns
-    print("Creating empty DataFrame as fallback")
-    df = pd.DataFrame(columns=['Name', 'Calories', 'FatContent', 'SaturatedFatContent', 'CholesterolContent', 'SodiumContent', 
-                              'CarbohydrateContent', 'FiberContent', 'SugarContent', 'ProteinContent',
-                              'RecipeIngredientParts', 'CookTime', 'PrepTime', 'TotalTime'])
-
-# Nutrition values used for food recommendations
-nutrition_features = ['Calories', 'FatContent', 'SaturatedFatContent', 'CholesterolContent', 'SodiumContent', 
-                      'CarbohydrateContent', 'FiberContent', 'SugarContent', 'ProteinContent']
-
-# Check if the dataset has all required features
-missing_features = [feature for feature in nutrition_features if feature not in df.columns]
-if missing_features:
-    print(f"Warning: Dataset is missing the following features: {missing_features}")
-    for feature in missing_features:
-        df[feature] = 0  # Add missing columns with zeros
+configure_logging()
+logger = logging.getLogger('inertiafit.api')
+
+api = Blueprint('api', __name__)
 
 # Person class for health calculations
 class Person:
-    def __init__(self, age, height, weight, gender, activity, weight_goal):
+    # Shared with the vectorized calculator in python/population.py
+    activity_levels = activity_levels
+
+    def __init__(self, age, height, weight, gender, activity, weight_goal, seed=None):
         self.age = age
         self.height = height
         self.weight = weight
         self.gender = gender
         self.activity = activity
         self.weight_goal = weight_goal
+        # Optional seed for varied but reproducible target profiles (see build_target_nutrition)
+        self.seed = seed
         self.meals_calories_perc = {'breakfast': 0.30, 'lunch': 0.40, 'dinner': 0.30}
         
         # Map weight goals to multipliers
@@ -79,46 +50,55 @@ class Person:
             "Gain": 1.2        # Weight gain
         }
         self.weight_loss = self.weight_loss_map.get(weight_goal, 1.0)
-        print(f"\nInitialized Person: age={age}, height={height}cm, weight={weight}kg, gender={gender}")
-        print(f"Goal: {weight_goal} (multiplier: {self.weight_loss})")
+        logger.debug("Initialized Person: age=%s, height=%scm, weight=%skg, gender=%s, goal=%s (multiplier: %s)",
+                     age, height, weight, gender, weight_goal, self.weight_loss)
 
     def calculate_bmi(self):
         bmi = round(self.weight / ((self.height / 100) ** 2), 2)
-        print(f"BMI Calculation: {self.weight} / ({self.height/100})² = {bmi}")
+        logger.debug("BMI Calculation: %s / (%s)² = %s", self.weight, self.height / 100, bmi)
         return bmi
 
     def display_result(self):
         bmi = self.calculate_bmi()
         category = ('Underweight' if bmi < 18.5 else 'Normal weight' if bmi < 25 else 'Overweight' if bmi < 30 else 'Obesity')
-        print(f"BMI Category: {bmi} kg/m² -> {category}")
+        logger.debug("BMI Category: %s kg/m² -> %s", bmi, category)
         return bmi, category
 
     def calculate_bmr(self):
         # Mifflin-St Jeor Equation
         bmr = 10 * self.weight + 6.25 * self.height - 5 * self.age + (5 if self.gender == 'Male' else -161)
-        print(f"BMR Calculation: 10*{self.weight} + 6.25*{self.height} - 5*{self.age} + {5 if self.gender == 'Male' else -161} = {bmr}")
+        logger.debug("BMR Calculation: 10*%s + 6.25*%s - 5*%s + %s = %s",
+                     self.weight, self.height, self.age, 5 if self.gender == 'Male' else -161, bmr)
         return bmr
 
-    def calories_calculator(self):
-        activity_levels = ['Little/no exercise', 'Light exercise', 'Moderate exercise', 'Heavy exercise', 'Very heavy exercise']
-        weights = [1.2, 1.375, 1.55, 1.725, 1.9]
-        
+    def activity_index(self):
         # Find the most similar activity level if not an exact match
-        activity_index = 0
-        for i, level in enumerate(activity_levels):
+        for i, level in enumerate(self.activity_levels):
             if level.lower() in self.activity.lower():
-                activity_index = i
-                break
+                return i
+        return 0
+
+    def cache_key(self):
+        # Normalized inputs: everything that can change the calculated recommendations.
+        # None when targets are sampled afresh on every call, so nothing is cached
+        if self.seed is None and target_profiles.TARGET_PROFILE_MODE == 'random':
+            return None
+        goal = self.weight_goal if self.weight_goal in self.weight_loss_map else None
+        return (self.age, self.height, float(self.weight), self.gender == 'Male', self.activity_index(), goal, self.seed)
+
+    def calories_calculator(self):
+        weights = [1.2, 1.375, 1.55, 1.725, 1.9]
+        activity_index = self.activity_index()
         
         bmr = self.calculate_bmr()
         tdee = bmr * weights[activity_index]
-        print(f"TDEE Calculation: {bmr} * {weights[activity_index]} (activity multiplier) = {tdee}")
+        logger.debug("TDEE Calculation: %s * %s (activity multiplier) = %s", bmr, weights[activity_index], tdee)
         return tdee
 
     def calculate_macros(self):
         tdee = self.calories_calculator()
         total_calories = round(self.weight_loss * tdee)
-        print(f"Adjusted Calories: {tdee} * {self.weight_loss} (goal multiplier) = {total_calories}")
+        logger.debug("Adjusted Calories: %s * %s (goal multiplier) = %s", tdee, self.weight_loss, total_calories)
         
         # Calculate macronutrients based on weight goal
         if self.weight_goal == "Lose":
@@ -134,8 +114,8 @@ class Person:
             fat_g = round(self.weight * 0.8)     # Moderate fat for maintenance
             carbs_g = round((total_calories - (protein_g * 4 + fat_g * 9)) / 4)  # Remaining calories from carbs
         
-        print(f"Macros: Protein={protein_g}g, Carbs={carbs_g}g, Fats={fat_g}g")
-        print(f"Calorie breakdown: Protein={protein_g*4}kcal, Carbs={carbs_g*4}kcal, Fats={fat_g*9}kcal, Total={protein_g*4 + carbs_g*4 + fat_g*9}kcal")
+        logger.debug("Macros: Protein=%sg, Carbs=%sg, Fats=%sg (Total=%skcal)",
+                     protein_g, carbs_g, fat_g, protein_g * 4 + carbs_g * 4 + fat_g * 9)
         
         return {
             "calories": total_calories,
@@ -144,45 +124,11 @@ class Person:
             "fats": fat_g
         }
 
-    def generate_recommendations(self):
-        bmi, category = self.display_result()
-        macros = self.calculate_macros()
-        
-        # Generate ML-based recipe recommendations
-        print("\n===== GENERATING ML-BASED RECIPE RECOMMENDATIONS =====")
-        try:
-            # Calculate calories for each meal based on distribution
-            breakfast_calories = round(macros["calories"] * 0.3)
-            lunch_calories = round(macros["calories"] * 0.4)
-            dinner_calories = round(macros["calories"] * 0.3)
-            
-            print(f"Breakfast target calories: {breakfast_calories}")
-            print(f"Lunch target calories: {lunch_calories}")
-            print(f"Dinner target calories: {dinner_calories}")
-            
-            # Get recipe recommendations using KNN algorithm
-            breakfast_recipes = get_recommended_recipes(df, breakfast_calories, top_n=3)
-            lunch_recipes = get_recommended_recipes(df, lunch_calories, top_n=3)
-            dinner_recipes = get_recommended_recipes(df, dinner_calories, top_n=3)
-            
-            print(f"ML recommended breakfast recipes: {[recipe['Name'] for recipe in breakfast_recipes]}")
-            print(f"ML recommended lunch recipes: {[recipe['Name'] for recipe in lunch_recipes]}")
-            print(f"ML recommended dinner recipes: {[recipe['Name'] for recipe in dinner_recipes]}")
-            
-            # Add ML recipe recommendations to response
-            recipe_recommendations = {
-                "breakfast": breakfast_recipes,
-                "lunch": lunch_recipes,
-                "dinner": dinner_recipes
-            }
-        except Exception as e:
-            print(f"Error generating ML recipe recommendations: {str(e)}")
-            recipe_recommendations = {
-                "breakfast": [],
-                "lunch": [],
-                "dinner": []
-            }
-        
+    def meal_calories(self, macros):
+        # Calculate calories for each meal based on distribution
+        return {meal: round(macros["calories"] * perc) for meal, perc in self.meals_calories_perc.items()}
+
+    def build_response(self, bmi, category, macros, recipe_recommendations):
         return {
             "bmi": str(bmi),
             "category": category,
@@ -193,150 +139,491 @@ class Person:
             "recipes": recipe_recommendations
         }
 
-# ML Model for food recommendation using KNN (not used directly in the API yet, but can be integrated)
-def get_recommended_recipes(df, meal_calories, top_n=3):
-    print(f"Starting recipe recommendation for {meal_calories} calories")
-    try:
-        # Filter the DataFrame to handle potential NaN values
-        df_filtered = df.dropna(subset=nutrition_features)
-        print(f"Filtered dataset size: {len(df_filtered)} recipes")
-        
-        # Extract nutrition features
-        X = df_filtered[nutrition_features]
+    def generate_recommendations(self, explain=False, batched=False):
+        with metrics.stage('person'):
+            bmi, category = self.display_result()
+            macros = self.calculate_macros()
         
-        # Normalize the data
-        scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(X)
-        
-        # Train KNN model
-        print("Training KNN model...")
-        knn = NearestNeighbors(n_neighbors=top_n, metric='cosine')
-        knn.fit(X_scaled)
-        
-        # Generate target nutrition profile based on meal calories
-        protein_target = rnd(meal_calories * 0.25 / 4, meal_calories * 0.35 / 4)  # 25-35% of calories from protein
-        carbs_target = rnd(meal_calories * 0.45 / 4, meal_calories * 0.65 / 4)    # 45-65% of calories from carbs
-        fat_target = rnd(meal_calories * 0.2 / 9, meal_calories * 0.35 / 9)      # 20-35% of calories from fat
-        
-        # Convert macros to approximations of other nutrition values
-        target_nutrition = np.array([
-            meal_calories,                          # Calories
-            fat_target,                             # FatContent (g)
-            fat_target * 0.3,                       # SaturatedFatContent (g) - ~30% of fat
-            protein_target * 3,                     # CholesterolContent (mg) - rough approximation
-            meal_calories * 0.2,                    # SodiumContent (mg) - rough approximation
-            carbs_target,                           # CarbohydrateContent (g)
-            carbs_target * 0.15,                    # FiberContent (g) - ~15% of carbs
-            carbs_target * 0.2,                     # SugarContent (g) - ~20% of carbs
-            protein_target                          # ProteinContent (g)
-        ])
-        
-        print(f"Target nutrition profile: Protein={protein_target}g, Carbs={carbs_target}g, Fat={fat_target}g")
+        # Generate ML-based recipe recommendations
+        meal_calories = self.meal_calories(macros)
+        logger.debug("Meal target calories: %s", meal_calories)
         
-        # Scale the target nutrition values
-        target_scaled = scaler.transform([target_nutrition])
+        # Resolve every meal in a single neighbor query
+        meal_recipes = get_recommended_recipes_batch(list(meal_calories.values()), top_n=3, seed=self.seed, explain=explain,
+                                                     batched=batched)
+        recipe_recommendations = dict(zip(meal_calories.keys(), meal_recipes))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("ML recommended recipes: %s",
+                         {meal: [recipe['Name'] for recipe in recipes] for meal, recipes in recipe_recommendations.items()})
         
-        # Find nearest neighbors
-        distances, indices = knn.kneighbors(target_scaled)
+        return self.build_response(bmi, category, macros, recipe_recommendations)
+
+    def generate_meal_plan(self, days=7, repeat_window=None, tolerance=0.1):
+        with metrics.stage('person'):
+            bmi, category = self.display_result()
+            macros = self.calculate_macros()
         
-        # Get recommended recipes
-        recommendations = df_filtered.iloc[indices[0]][['Name', 'Calories', 'RecipeIngredientParts', 'CookTime', 'PrepTime', 'TotalTime']]
+        # Whole days chosen against the daily macros, rather than each meal on its own
+        plan = plan_meals(get_engine(), macros, self.meal_calories(macros), days=days,
+                          repeat_window=repeat_window, tolerance=tolerance, seed=self.seed)
+        response = self.build_response(bmi, category, macros, None)
+        del response['recipes']
+        response.update({'tolerance': tolerance, 'repeat_window': repeat_window or days, 'days': plan})
+        return response
+
+# ML Model for food recommendation using KNN over the shared, prebuilt index
+def query_recipes(target_nutrition, top_n=3, explain=False, batched=False):
+    logger.debug("Starting recipe recommendation for %d meal(s)", len(target_nutrition))
+    try:
+        # Query the shared neighbor index once for every target, together with concurrent
+        # requests' targets when ``batched`` (see run_search)
+        if batched:
+            return micro_batcher.recommend_batch(target_nutrition, top_n)
+        return get_engine().recommend_batch(target_nutrition, top_n, explain=explain)
+
+    except (Overloaded, RequestTimeout):
+        raise
+    except Exception:
+        logger.exception("Error in query_recipes")
         
-        # Convert to dictionary format
-        result = recommendations.to_dict(orient='records')
-        print(f"Found {len(result)} recipe recommendations")
-        return result
+        # Return empty lists in case of error
+        return [[] for _ in range(len(target_nutrition))]
+
+def get_recommended_recipes_batch(meal_calories_list, top_n=3, seed=None, explain=False, batched=False):
+    with metrics.stage('targets'):
+        target_nutrition = build_target_nutrition(meal_calories_list, seed=seed)
+    return query_recipes(target_nutrition, top_n=top_n, explain=explain, batched=batched)
+
+def get_recommended_recipes(meal_calories, top_n=3, seed=None):
+    return get_recommended_recipes_batch([meal_calories], top_n=top_n, seed=seed)[0]
+
+def run_search(batched, fn, *args):
+    """Run a request's search work: on the work pool, or with ``batched`` on this thread.
+
+    Batched work sends its query to the micro-batcher, which runs it on its own thread
+    and bounds its own queue. Waiting here rather than on a pool thread lets a batch
+    collect every concurrent request, not just one per pool thread.
+    """
+    if batched:
+        return fn(*args)
+    return work_pool.run(fn, *args)
+
+def nutrition_cache_key(person, top_n=3, explain=False):
+    # Keys taken when a request starts name the engine generation, so a result computed
+    # on an engine that was replaced meanwhile is stored where no later request looks
+    person_key = person.cache_key()
+    return None if person_key is None else ('nutrition', engine_generation(), person_key, top_n, explain)
+
+def cache_recommendations(key, recommendations):
+    # Only cache complete results, never the empty fallback of a failed query
+    if all(recommendations['recipes'].values()):
+        response_cache.set(key, recommendations)
+
+def generate_batch_recommendations(people, top_n=3):
+    """Generate recommendations for many people with one neighbor query across all their meals.
+
+    People whose normalized inputs are already in the response cache skip the search.
+    """
+    responses = [None] * len(people)
+    pending = []
+    targets = []
+    for i, person in enumerate(people):
+        key = nutrition_cache_key(person, top_n)
+        cached = response_cache.get(key)
+        if cached is not None:
+            responses[i] = cached
+            continue
+        with metrics.stage('person'):
+            bmi, category = person.display_result()
+            macros = person.calculate_macros()
+            meal_calories = person.meal_calories(macros)
+        pending.append((i, key, person, bmi, category, macros, list(meal_calories.keys())))
+        with metrics.stage('targets'):
+            targets.append(build_target_nutrition(list(meal_calories.values()), seed=person.seed))
     
-    except Exception as e:
-        print(f"Error in get_recommended_recipes: {str(e)}")
-        print(f"Error type: {type(e).__name__}")
-        import traceback
-        traceback.print_exc()
-        
-        # Return empty list in case of error
-        return []
+    all_recipes = query_recipes(np.vstack(targets), top_n=top_n) if targets else []
+    
+    offset = 0
+    for i, key, person, bmi, category, macros, meals in pending:
+        recipe_recommendations = dict(zip(meals, all_recipes[offset:offset + len(meals)]))
+        offset += len(meals)
+        responses[i] = person.build_response(bmi, category, macros, recipe_recommendations)
+        cache_recommendations(key, responses[i])
+    return responses
+
+def response_cache_metrics():
+    stats = response_cache.stats()
+    return [
+        ('inertiafit_response_cache_hits_total', 'counter', 'Response cache hits', [({}, stats['hits'])]),
+        ('inertiafit_response_cache_misses_total', 'counter', 'Response cache misses', [({}, stats['misses'])]),
+        ('inertiafit_response_cache_evictions_total', 'counter', 'Response cache evictions', [({}, stats['evictions'])]),
+        ('inertiafit_response_cache_entries', 'gauge', 'Entries in the response cache', [({}, stats['size'])]),
+    ]
+
+metrics.registry.register_collector(response_cache_metrics)
+
+# Endpoints that answer while the recipe index is still loading
+readiness_exempt_endpoints = {'api.index', 'api.health_check', 'api.prometheus_metrics'}
 
-@app.route('/', methods=['GET'])
+@api.before_app_request
+def start_request_metrics():
+    g.metrics_start = time.perf_counter()
+    g.metrics_tokens = metrics.begin_request(request.url_rule.rule if request.url_rule else 'unmatched')
+
+@api.before_app_request
+def start_catalog_watcher():
+    catalog_watcher.ensure_running()
+
+@api.before_app_request
+def require_ready_index():
+    if not engine_ready() and request.endpoint not in readiness_exempt_endpoints:
+        response = jsonify({'error': 'The recipe index is still loading, retry shortly'})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+
+@api.after_app_request
+def record_request_metrics(response):
+    tokens = g.pop('metrics_tokens', None)
+    if tokens is None:
+        return response
+    timings = metrics.end_request(tokens)
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    elapsed = time.perf_counter() - g.metrics_start
+    metrics.registry.observe('inertiafit_request_seconds', elapsed, 'End-to-end request latency in seconds', endpoint=endpoint)
+    metrics.registry.inc('inertiafit_requests_total', 1, 'Requests handled', endpoint=endpoint, status=response.status_code)
+    if metrics.SERVER_TIMING:
+        response.headers['Server-Timing'] = metrics.server_timing_header(timings + [('total', elapsed)])
+    return response
+
+@api.teardown_app_request
+def reset_request_metrics(exc):
+    # after_request is skipped on unhandled errors, so release the request's context here
+    tokens = g.pop('metrics_tokens', None)
+    if tokens is not None:
+        metrics.end_request(tokens)
+
+@api.app_errorhandler(ValidationError)
+def invalid_request(e):
+    logger.info("Invalid request to %s: %s", request.path, e.message)
+    return jsonify({'error': e.message, 'field': e.field}), 400
+
+@api.app_errorhandler(Overloaded)
+def overloaded(e):
+    response = jsonify({'error': 'The server is busy, retry shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+@api.app_errorhandler(RequestTimeout)
+def request_timeout(e):
+    logger.warning("Request to %s timed out after %ss", request.path, work_pool.timeout)
+    return jsonify({'error': 'Timed out generating recommendations'}), 504
+
+def json_response(body):
+    # body is already-serialized JSON, produced on the work pool
+    return current_app.response_class(body + '\n', mimetype='application/json')
+
+@api.route('/api/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+@api.route('/', methods=['GET'])
 def index():
     return jsonify({
         "message": "Welcome to InertiaFit Personalized Food Recommendation System API",
         "endpoints": {
             "/api/health": "Health check endpoint",
+            "/api/metrics": "Prometheus metrics",
             "/api/nutrition": "POST endpoint for nutrition recommendations",
-            "/api/custom-nutrition": "POST endpoint for custom nutrition recommendations"
+            "/api/nutrition/batch": "POST endpoint for nutrition recommendations for many user profiles",
+            "/api/custom-nutrition": "POST endpoint for custom nutrition recommendations",
+            "/api/meal-plan": "POST endpoint for a multi-day meal plan that meets the daily macro targets",
+            "/api/admin/recipes": "POST endpoint to add or update recipes (admin token required)",
+            "/api/admin/recipes/delete": "POST endpoint to remove recipes (admin token required)",
+            "/api/admin/catalog": "GET catalog status (admin token required)",
+            "/api/admin/catalog/reload": "POST endpoint to reload the catalog from the CSV (admin token required)"
         }
     })
 
-@app.route('/api/nutrition', methods=['POST'])
+def person_from_values(values):
+    # values: a profile validated by profile_schema
+    return Person(values['age'], values['height'], values['weight'], values['gender'], values['activityLevel'],
+                  values['weightGoal'], values['seed'])
+
+def validated_json(schema):
+    """Validate the request's JSON body against a schema; ValidationError is answered with a 400."""
+    with metrics.stage('parse'):
+        return schema.validate(request.get_json(silent=True))
+
+@api.route('/api/nutrition', methods=['POST'])
 def nutrition_recommendation():
-    data = request.json
-    
-    # Print received data from frontend
-    print("\n===== RECEIVED NUTRITION REQUEST =====")
-    print(f"Age: {data.get('age', 30)}")
-    print(f"Height: {data.get('height', 170)} cm")
-    print(f"Weight: {data.get('weight', 70)} kg")
-    print(f"Gender: {data.get('gender', 'Male')}")
-    print(f"Activity Level: {data.get('activityLevel', 'Little/no exercise')}")
-    print(f"Weight Goal: {data.get('weightGoal', 'Maintain')}")
-    
-    # Extract data from the request
-    age = int(data.get('age', 30))
-    height = int(data.get('height', 170))
-    weight = float(data.get('weight', 70))
-    gender = data.get('gender', 'Male')
-    activity_level = data.get('activityLevel', 'Little/no exercise')
-    weight_goal = data.get('weightGoal', 'Maintain')
+    values = validated_json(nutrition_schema)
+    logger.debug("Received nutrition request: %s", values)
     
     # Create Person object and generate recommendations
-    person = Person(age, height, weight, gender, activity_level, weight_goal)
-    recommendations = person.generate_recommendations()
-    
-    # Print calculated recommendations
-    print("\n===== NUTRITION RECOMMENDATIONS GENERATED =====")
-    print(f"BMI: {recommendations['bmi']} - Category: {recommendations['category']}")
-    print(f"Calories: {recommendations['calories']} kcal")
-    print(f"Protein: {recommendations['protein']} g")
-    print(f"Carbs: {recommendations['carbs']} g")
-    print(f"Fats: {recommendations['fats']} g")
-    print(f"Meal Plan: Breakfast: {recommendations['recipes']['breakfast'][0]['Name'][:30]}...")
-    print("===== END OF RECOMMENDATIONS =====\n")
+    person = person_from_values(values)
+    cache_key = nutrition_cache_key(person, explain=values['explain'])
+    with metrics.stage('cache'):
+        recommendations = response_cache.get(cache_key)
+    if recommendations is None:
+        # Search and serialize on the work pool, or micro-batched; identical concurrent
+        # requests share one run
+        batched = micro_batcher is not None and not values['explain']
+        return json_response(coalescer.run(cache_key, run_search, batched, nutrition_body, person, values['explain'],
+                                           batched, cache_key, current_app.json))
+    logger.debug("Serving cached recommendations")
     
-    return jsonify(recommendations)
+    with metrics.stage('serialize'):
+        return jsonify(recommendations)
+
+def nutrition_body(person, explain, batched, cache_key, json_provider):
+    recommendations = person.generate_recommendations(explain, batched)
+    cache_recommendations(cache_key, recommendations)
+    logger.debug("Nutrition recommendations generated: BMI=%s (%s), %s kcal, protein=%sg, carbs=%sg, fats=%sg",
+                 recommendations['bmi'], recommendations['category'], recommendations['calories'],
+                 recommendations['protein'], recommendations['carbs'], recommendations['fats'])
+    with metrics.stage('serialize'):
+        return json_provider.dumps(recommendations)
+
+@api.route('/api/nutrition/batch', methods=['POST'])
+def batch_nutrition_recommendation():
+    values = validated_json(batch_schema)
+    logger.debug("Received batch nutrition request with %d profiles", len(values['profiles']))
+    people = [person_from_values(profile) for profile in values['profiles']]
+    try:
+        return json_response(work_pool.run(batch_body, people, values['nb_recommendations'], current_app.json))
+    except (Overloaded, RequestTimeout):
+        raise
+    except Exception:
+        logger.exception("Error generating batch recommendations")
+        return jsonify({'error': 'Failed to generate recommendations'}), 500
+
+def batch_body(people, top_n, json_provider):
+    results = generate_batch_recommendations(people, top_n=top_n)
+    with metrics.stage('serialize'):
+        return json_provider.dumps({'results': results})
+
+@api.route('/api/meal-plan', methods=['POST'])
+def meal_plan():
+    values = validated_json(meal_plan_schema)
+    person = person_from_values(values)
+    days, repeat_window, tolerance = values['days'], values['repeat_window'], values['tolerance']
+
+    person_key = person.cache_key()
+    cache_key = None if person_key is None else ('meal-plan', engine_generation(), person_key, days, repeat_window, tolerance)
+    with metrics.stage('cache'):
+        plan = response_cache.get(cache_key)
+    if plan is None:
+        return json_response(coalescer.run(cache_key, work_pool.run, meal_plan_body, person, days, repeat_window,
+                                           tolerance, cache_key, current_app.json))
+    with metrics.stage('serialize'):
+        return jsonify(plan)
 
-@app.route('/api/health', methods=['GET'])
+def meal_plan_body(person, days, repeat_window, tolerance, cache_key, json_provider):
+    plan = person.generate_meal_plan(days, repeat_window, tolerance)
+    if plan['days']:
+        response_cache.set(cache_key, plan)
+    with metrics.stage('serialize'):
+        return json_provider.dumps(plan)
+
+@api.route('/api/health', methods=['GET'])
 def health_check():
-    return jsonify({"status": "up", "message": "Flask API is running"})
+    # Ready only once the dataset is loaded and the neighbor index is built
+    if not engine_ready():
+        return jsonify({"status": "loading", "message": "Loading the recipe index", "cache": response_cache.stats()}), 503
+    # A failed load leaves an empty catalog, which cannot recommend anything
+    recipes = len(get_engine())
+    if recipes == 0:
+        return jsonify({"status": "error", "message": load_error() or "No recipes with complete nutrition data",
+                        "recipes": 0, "cache": response_cache.stats()}), 503
+    return jsonify({"status": "ready", "message": "Flask API is running", "recipes": recipes,
+                    "cache": response_cache.stats()})
 
-@app.route('/api/custom-nutrition', methods=['POST'])
+@api.route('/api/custom-nutrition', methods=['POST'])
 def get_custom_recommendations():
+    data = request.get_json(silent=True)
+    if isinstance(data, dict) and 'cursor' in data:
+        # A cursor carries the whole request it continues
+        state = validated_json(custom_next_page_schema)['cursor']
+    else:
+        values = validated_json(custom_schema)
+        state = dict(values, offset=0) if values['paginate'] else None
     try:
-        data = request.get_json()
-        nutrition_values_list = data.get('nutrition_values_list')
-        nb_recommendations = data.get('nb_recommendations', 6)
-        ingredient_txt = data.get('ingredient_txt', '')
+        if state is not None:
+            # Pages are sliced from a ranking that custom_page_body keeps in the cache
+            body = work_pool.run(custom_page_body, state, current_app.json)
+            if body is None:
+                return jsonify({'error': 'No recommendations found for the given nutritional values'}), 404
+            return json_response(body)
 
-        if not nutrition_values_list or len(nutrition_values_list) != 9:
-            return jsonify({'error': 'Invalid nutrition values provided'}), 400
+        # Repeat queries are served from the response cache without searching; the
+        # validated values are canonical, so equivalent requests share an entry
+        cache_key = ('custom', engine_generation()) + custom_schema.key(values)
+        with metrics.stage('cache'):
+            recommendations = response_cache.get(cache_key)
+        if recommendations is None:
+            recommendation = Recommendation(values['nutrition_values_list'], values['nb_recommendations'],
+                                            values['ingredient_txt'], values['excluded_ingredients'], values['explain'])
+            # Unfiltered searches without explain share the nutrition queries' micro-batches
+            batched = micro_batcher is not None and recommendation.batchable()
+            body = coalescer.run(cache_key, run_search, batched, custom_body, recommendation, batched, cache_key,
+                                 current_app.json)
+            if body is None:
+                return jsonify({'error': 'No recommendations found for the given nutritional values'}), 404
+            return json_response(body)
 
-        recommendation = Recommendation(nutrition_values_list, nb_recommendations, ingredient_txt)
-        recommendations = recommendation.generate()
+        with metrics.stage('serialize'):
+            return jsonify(recommendations)
+    except (Overloaded, RequestTimeout):
+        raise
+    except Exception:
+        logger.exception("Error generating recommendations")
+        return jsonify({'error': 'Failed to generate recommendations'}), 500
 
-        if not recommendations:
-            return jsonify({'error': 'No recommendations found for the given nutritional values'}), 404
+def custom_body(recommendation, batched, cache_key, json_provider):
+    recommendations = recommendation.generate(micro_batcher if batched else None)
+    if not recommendations:
+        return None
+    response_cache.set(cache_key, recommendations)
+    with metrics.stage('serialize'):
+        return json_provider.dumps(recommendations)
 
-        return jsonify(recommendations)
-    except Exception as e:
-        print(f"Error generating recommendations: {e}")
-        return jsonify({'error': 'Failed to generate recommendations'}), 500
+# Matches searched at once for paginated custom recommendations; later pages are sliced
+# from the stored ranking until a page runs past it
+RANKING_DEPTH = 100
+
+def custom_page_body(state, json_provider):
+    recommendation = Recommendation(state['nutrition_values_list'], state['nb_recommendations'], state['ingredient_txt'],
+                                    state['excluded_ingredients'], state['explain'])
+    offset = state['offset']
+    end = offset + recommendation.nb_recommendations
+    # Rankings depend only on the target and filters, so every page size and explain mode
+    # shares one; the stored engine guards against row ids from a replaced catalog
+    ranking_key = ('ranking', state['nutrition_values_list'], state['ingredient_txt'], state['excluded_ingredients'])
+    cached = response_cache.get(ranking_key)
+    if cached is None or cached[0] is not get_engine() or (len(cached[2]) < end and len(cached[2]) == cached[3]):
+        depth = min(max(RANKING_DEPTH, 2 * end), MAX_CURSOR_RESULTS)
+        cached = recommendation.ranking(depth) + (depth,)
+        response_cache.set(ranking_key, cached)
+    engine, distances, indices, depth = cached
+
+    if offset == 0 and len(indices) == 0:
+        return None  # like the unpaginated request; later pages may simply run out
+    recipes = recommendation.page((engine, distances, indices), offset)
+    # More results exist while the ranking goes on, or was cut off at its depth
+    more = end < len(indices) or (len(indices) == depth and end < MAX_CURSOR_RESULTS)
+    body = {'recipes': recipes, 'next_cursor': encode_cursor(custom_cursor_schema, state, offset=end) if more else None}
+    with metrics.stage('serialize'):
+        return json_provider.dumps(body)
+
+def check_admin_token():
+    """Return an error response unless the request carries the ADMIN_TOKEN bearer token."""
+    token = os.environ.get('ADMIN_TOKEN')
+    if not token:
+        return jsonify({'error': 'The admin API is disabled, set ADMIN_TOKEN to enable it'}), 403
+    if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()):
+        return jsonify({'error': 'Invalid admin token'}), 401
+    return None
+
+def apply_catalog_updates(full=False):
+    # With ?wait=true apply the update here and answer with the new catalog status,
+    # otherwise apply it in the background
+    if request.args.get('wait', '').lower() in ('1', 'true', 'yes'):
+        try:
+            catalog_watcher.sync(full=full)
+        except Exception:
+            logger.exception("Failed to update the recipe catalog")
+            return jsonify({'error': 'Failed to update the recipe catalog'}), 500
+        return jsonify(catalog_watcher.status())
+    catalog_watcher.sync_soon(full=full)
+    return jsonify({'status': 'accepted'}), 202
+
+def submit_catalog_change(change):
+    try:
+        catalog_watcher.append(change)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return apply_catalog_updates()
+
+@api.route('/api/admin/recipes', methods=['POST'])
+def admin_upsert_recipes():
+    error = check_admin_token()
+    if error is not None:
+        return error
+    data = request.get_json(silent=True)
+    return submit_catalog_change({'op': 'upsert', 'recipes': data.get('recipes') if isinstance(data, dict) else None})
+
+@api.route('/api/admin/recipes/delete', methods=['POST'])
+def admin_remove_recipes():
+    error = check_admin_token()
+    if error is not None:
+        return error
+    data = request.get_json(silent=True)
+    ids = data.get('ids') if isinstance(data, dict) else None
+    if not isinstance(ids, list) or not all(isinstance(recipe_id, (str, int)) for recipe_id in ids):
+        return jsonify({'error': 'Expected an "ids" list of recipe ids'}), 400
+    return submit_catalog_change({'op': 'remove', 'ids': ids})
+
+@api.route('/api/admin/catalog', methods=['GET'])
+def admin_catalog_status():
+    error = check_admin_token()
+    if error is not None:
+        return error
+    return jsonify(catalog_watcher.status())
+
+@api.route('/api/admin/catalog/reload', methods=['POST'])
+def admin_reload_catalog():
+    error = check_admin_token()
+    if error is not None:
+        return error
+    return apply_catalog_updates(full=True)
+
+def load_index():
+    try:
+        get_engine()
+        # Replay recipe changes made through the admin API since the CSV was written
+        catalog_watcher.attach()
+    except Exception:
+        logger.exception("Failed to build the recipe index")
+
+def create_app(index_loading=None):
+    """Create the Flask application.
+
+    ``index_loading`` (default: the INDEX_LOADING environment variable, else 'eager') sets when
+    the dataset is loaded and the neighbor index built:
+
+    - 'eager': before returning. Under a preloading server (see gunicorn.conf.py) this happens
+      once in the master process, and the forked workers share the index copy-on-write.
+    - 'background': in a thread. /api/health reports "loading" and the recommendation
+      endpoints answer 503 until it is ready. Only for single-process servers, because
+      threads do not survive fork.
+    """
+    index_loading = index_loading or os.environ.get('INDEX_LOADING', 'eager')
+    if index_loading not in ('eager', 'background'):
+        raise ValueError(f"Unknown INDEX_LOADING mode {index_loading!r}; expected 'eager' or 'background'")
+
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    CORS(app)  # Enable CORS for all routes
+    app.register_blueprint(api)
+
+    if index_loading == 'eager':
+        load_index()
+    elif not engine_ready():
+        threading.Thread(target=load_index, name='index-loader', daemon=True).start()
+    return app
+
+app = create_app()
 
 if __name__ == '__main__':
     print("\n===== STARTING FLASK SERVER =====")
     print(f"Flask API is running at http://localhost:5000")
     print("Available endpoints:")
     print("  GET  /api/health - Health check")
+    print("  GET  /api/metrics - Prometheus metrics")
     print("  POST /api/nutrition - Nutrition recommendations")
+    print("  POST /api/nutrition/batch - Batch nutrition recommendations")
     print("  POST /api/custom-nutrition - Custom nutrition recommendations")
+    print("  POST /api/meal-plan - Multi-day meal plans")
     print("  GET  / - API information")
     print("\nPress Ctrl+C to stop the server")
     print("=====================================\n")
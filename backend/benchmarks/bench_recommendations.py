@@ -0,0 +1,223 @@
+"""Benchmarks for the recommendation hot paths on synthetic recipe tables.
+
+Run from the backend directory, for example:
+
+    python benchmarks/bench_recommendations.py --rows 10000 100000 --output bench_results.json
+
+Every run writes one machine-readable JSON file, so results can be compared across commits.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, backend_dir)
+
+from python import recommendation_engine  # noqa: E402
+from python.ingredients import IngredientIndex  # noqa: E402
+from python.recipe_cache import load_recipe_arrays  # noqa: E402
+from python.recipe_columns import RecipeColumns  # noqa: E402
+from python.recommendation_engine import (RecommendationEngine, ingredient_column, metadata_columns,  # noqa: E402
+                                          nutrition_features)
+from python.search_backends import make_backend  # noqa: E402
+
+# Rough per-recipe nutrient ranges, in nutrition_features order
+feature_ranges = [(20, 1500), (0, 80), (0, 30), (0, 400), (0, 2500), (0, 200), (0, 25), (0, 80), (0, 90)]
+
+
+def make_synthetic_recipes(n_rows, seed=0, n_ingredients=500):
+    """Return a recipes DataFrame shaped like recipes.csv with the nine nutrition_features columns."""
+    rng = np.random.default_rng(seed)
+    data = {'Name': [f'Recipe {i}' for i in range(n_rows)],
+            'CookTime': 'PT30M', 'PrepTime': 'PT15M', 'TotalTime': 'PT45M'}
+    for feature, (low, high) in zip(nutrition_features, feature_ranges):
+        data[feature] = rng.uniform(low, high, n_rows).round(1)
+
+    # Skewed ingredient popularity, like real recipes
+    vocabulary = np.array([f'ingredient {i}' for i in range(n_ingredients)])
+    popularity = 1.0 / np.arange(1, n_ingredients + 1)
+    popularity /= popularity.sum()
+    counts = rng.integers(2, 10, n_rows)
+    picks = rng.choice(n_ingredients, counts.sum(), p=popularity)
+    bounds = np.concatenate([[0], np.cumsum(counts)])
+    data[ingredient_column] = ['c(' + ', '.join(f'"{name}"' for name in vocabulary[picks[bounds[i]:bounds[i + 1]]]) + ')'
+                               for i in range(n_rows)]
+    return pd.DataFrame(data)
+
+
+def make_targets(n, seed=1):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([rng.uniform(low, high / 2, n) for low, high in feature_ranges])
+
+
+def summarize(samples):
+    samples_ms = np.asarray(samples) * 1000.0
+    return {
+        'count': len(samples_ms),
+        'mean_ms': float(samples_ms.mean()),
+        'p50_ms': float(np.percentile(samples_ms, 50)),
+        'p95_ms': float(np.percentile(samples_ms, 95)),
+        'p99_ms': float(np.percentile(samples_ms, 99)),
+        'max_ms': float(samples_ms.max()),
+    }
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024.0 * 1024.0) if sys.platform == 'darwin' else peak / 1024.0
+
+
+def bench_cold_start(df, work_dir):
+    """Time the first load (CSV parse plus cache build) and a warm load from the cache."""
+    csv_path = os.path.join(work_dir, 'recipes.csv')
+    df.to_csv(csv_path, index=False)
+    os.environ['RECIPES_CACHE_DIR'] = os.path.join(work_dir, 'cache')
+    try:
+        cold_seconds, _ = timed(load_recipe_arrays, csv_path, nutrition_features, metadata_columns, ingredient_column)
+        warm_seconds, arrays = timed(load_recipe_arrays, csv_path, nutrition_features, metadata_columns, ingredient_column)
+    finally:
+        del os.environ['RECIPES_CACHE_DIR']
+    return {'csv_mb': os.path.getsize(csv_path) / 1e6, 'cold_load_s': cold_seconds, 'cached_load_s': warm_seconds}, arrays
+
+
+def bench_engine(arrays, backend_name, options, n_queries, batch_size, top_n):
+    build_seconds, engine = timed(RecommendationEngine, *arrays, backend=make_backend(backend_name, **options))
+    targets = make_targets(n_queries)
+
+    single = [timed(engine.recommend, target, top_n)[0] for target in targets]
+
+    batch_seconds = []
+    for start in range(0, n_queries, batch_size):
+        batch_seconds.append(timed(engine.recommend_batch, targets[start:start + batch_size], top_n)[0])
+
+    return engine, {
+        'backend': backend_name,
+        'options': options,
+        'index_build_s': build_seconds,
+        'single_query': summarize(single),
+        'single_query_qps': n_queries / sum(single),
+        'batch_size': batch_size,
+        'batch_query': summarize(batch_seconds),
+        'batch_query_qps': n_queries / sum(batch_seconds),
+    }
+
+
+def bench_handlers(engine, n_requests):
+    """Time the Flask handlers and the functions behind them against the given engine."""
+    recommendation_engine.set_engine(engine)
+    import app as flask_app
+    from python.customized_recommendation_system import Recommendation
+    client = flask_app.app.test_client()
+
+    nutrition_body = {'age': 30, 'height': 175, 'weight': 70, 'gender': 'Male',
+                      'activityLevel': 'Moderate exercise', 'weightGoal': 'Maintain'}
+    custom_body = {'nutrition_values_list': [500, 20, 5, 50, 400, 60, 5, 10, 30], 'nb_recommendations': 6, 'ingredient_txt': ''}
+
+    def api_latencies(path, body):
+        return [timed(client.post, path, json=body)[0] for _ in range(n_requests)]
+
+    # Handler timings with the response cache off, so every request searches; cached
+    # latency is reported separately, after one request has filled the cache
+    cache_size, flask_app.response_cache.maxsize = flask_app.response_cache.maxsize, 0
+    try:
+        results = {
+            'get_recommended_recipes': summarize([timed(flask_app.get_recommended_recipes, 600, 3)[0] for _ in range(n_requests)]),
+            'recommendation_generate': summarize([timed(Recommendation(custom_body['nutrition_values_list'], 6, '').generate)[0]
+                                                  for _ in range(n_requests)]),
+            'api_nutrition': summarize(api_latencies('/api/nutrition', nutrition_body)),
+            'api_custom_nutrition': summarize(api_latencies('/api/custom-nutrition', custom_body)),
+        }
+    finally:
+        flask_app.response_cache.maxsize = cache_size
+    flask_app.response_cache.clear()
+    for name, path, body in (('api_nutrition_cached', '/api/nutrition', nutrition_body),
+                             ('api_custom_nutrition_cached', '/api/custom-nutrition', custom_body)):
+        client.post(path, json=body)
+        results[name] = summarize(api_latencies(path, body))
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=backend_dir, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the recommendation hot paths on synthetic recipe tables")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000], help='catalog sizes, 10k to 5M')
+    parser.add_argument('--backends', nargs='+', default=['exact', 'numpy', 'ivf'])
+    parser.add_argument('--backend-options', default='{}', help='JSON mapping of backend name to its options')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--top-n', type=int, default=6)
+    parser.add_argument('--requests', type=int, default=100, help='requests per Flask handler benchmark')
+    parser.add_argument('--skip-cold-start', action='store_true', help='skip writing and parsing the CSV')
+    parser.add_argument('--skip-handlers', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench_results.json')
+    args = parser.parse_args()
+    backend_options = json.loads(args.backend_options)
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'parameters': vars(args),
+        'runs': [],
+    }
+
+    for n_rows in args.rows:
+        print(f"Benchmarking {n_rows} recipes...")
+        run = {'rows': n_rows}
+        df = make_synthetic_recipes(n_rows, seed=args.seed)
+        with tempfile.TemporaryDirectory() as work_dir:
+            if args.skip_cold_start:
+                arrays = (RecipeColumns.from_frame(df, metadata_columns), df[nutrition_features].to_numpy(dtype=float),
+                          IngredientIndex.from_values(df[ingredient_column]))
+            else:
+                run['cold_start'], arrays = bench_cold_start(df, work_dir)
+            del df
+
+            run['engines'] = []
+            engine = None
+            for backend_name in args.backends:
+                engine, result = bench_engine(arrays, backend_name, backend_options.get(backend_name, {}),
+                                              args.queries, args.batch_size, args.top_n)
+                run['engines'].append(result)
+                print(f"  {backend_name}: build {result['index_build_s']:.2f}s, "
+                      f"single p50 {result['single_query']['p50_ms']:.2f}ms, batch {result['batch_query_qps']:.0f} q/s")
+
+            if not args.skip_handlers and engine is not None:
+                run['handlers'] = bench_handlers(engine, args.requests)
+        # Process-wide high-water mark, so it covers every run up to this one
+        run['peak_rss_mb'] = peak_rss_mb()
+        report['runs'].append(run)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
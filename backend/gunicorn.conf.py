@@ -0,0 +1,32 @@
+"""Production server settings. Run from the backend directory:
+
+    gunicorn -c gunicorn.conf.py
+
+Each setting can be overridden from the environment (BIND, WEB_CONCURRENCY,
+GUNICORN_THREADS, GUNICORN_TIMEOUT) or the gunicorn command line.
+"""
+import gc
+import multiprocessing
+import os
+
+wsgi_app = 'app:app'
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+# Handler threads mostly wait on the search work pool (python/serving.py), so a few per
+# worker keep a slow query from blocking the worker's other requests
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+
+# Import the app in the master process, so the dataset is loaded and the neighbor index
+# built once before forking; workers share that memory copy-on-write and start ready.
+# Background loading would not survive the fork, so always build it eagerly here.
+preload_app = True
+os.environ['INDEX_LOADING'] = 'eager'
+
+
+def when_ready(server):
+    # Runs in the master after the app is loaded and before workers are forked. Freezing
+    # the startup objects keeps the workers' garbage collections from writing to (and
+    # un-sharing) the pages that hold them.
+    gc.freeze()
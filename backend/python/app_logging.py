@@ -0,0 +1,139 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+# Attributes every LogRecord has; anything else was passed through ``extra=``
+_standard_attributes = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any ``extra=`` fields."""
+
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _standard_attributes and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Resolve the message now, but keep the traceback separate for the formatter
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a ``rate`` fraction of DEBUG records; INFO and above always pass."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = float(rate)
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or self.rate >= 1.0 or random.random() < self.rate
+
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per (logger, level, message template).
+
+    Allows ``per_second`` records per key on average with bursts of ``burst``. The number
+    of records dropped since the last one that passed is attached as ``suppressed``.
+    """
+
+    def __init__(self, per_second, burst=None):
+        super().__init__()
+        self.per_second = float(per_second)
+        self.burst = float(burst or max(1.0, self.per_second))
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.per_second <= 0:
+            return True
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            tokens, last, suppressed = self._buckets.get(key, (self.burst, now, 0))
+            tokens = min(self.burst, tokens + (now - last) * self.per_second)
+            if tokens < 1.0:
+                self._buckets[key] = (tokens, now, suppressed + 1)
+                return False
+            self._buckets[key] = (tokens - 1.0, now, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+_configured = False
+_listener = None
+
+
+def _stop_listener():
+    _listener.stop()
+
+
+def _restart_listener():
+    global _listener
+    _listener = logging.handlers.QueueListener(_listener.queue, *_listener.handlers)
+    _listener.start()
+
+
+def configure_logging():
+    """Configure process-wide logging from the environment, once.
+
+    LOG_LEVEL             minimum level (default INFO; per-request detail is DEBUG)
+    LOG_FORMAT            'json' (default) or 'text'
+    LOG_DEBUG_SAMPLE_RATE fraction of DEBUG records kept (default 1.0)
+    LOG_RATE_LIMIT        records per second per message template, 0 = unlimited (default 10)
+
+    Records are handed to a background thread through a queue, so request threads never
+    block on stdout.
+    """
+    global _configured, _listener
+    if _configured:
+        return
+    _configured = True
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if os.environ.get('LOG_FORMAT', 'json') == 'text':
+        stream_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    else:
+        stream_handler.setFormatter(JsonFormatter())
+
+    queue_handler = _QueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(SamplingFilter(os.environ.get('LOG_DEBUG_SAMPLE_RATE', 1.0)))
+    queue_handler.addFilter(RateLimitFilter(os.environ.get('LOG_RATE_LIMIT', 10)))
+    _listener = logging.handlers.QueueListener(queue_handler.queue, stream_handler)
+    _listener.start()
+    atexit.register(_stop_listener)
+    # Threads do not survive fork, so forked workers (gunicorn, process pools) need their own
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_restart_listener)
+
+    root = logging.getLogger()
+    root.addHandler(queue_handler)
+    root.setLevel(os.environ.get('LOG_LEVEL', 'INFO').upper())
@@ -0,0 +1,452 @@
+"""Live recipe catalog: add, update and remove recipes without restarting the server.
+
+Changes are appended to a changes file (RECIPES_CHANGES_FILE, default
+``recipes_changes.jsonl`` next to recipes.csv) that every server process follows. That
+way all gunicorn workers converge on the same catalog, and the changes survive restarts.
+Each process polls the CSV and the changes file every CATALOG_WATCH_INTERVAL seconds
+(default 5, 0 disables the watcher):
+
+- New lines in the changes file are applied incrementally, in time proportional to the
+  changed recipes (see ``CatalogEngine``). The fitted engine is kept as is: removed and
+  replaced recipes are masked out of it, and new ones go into a small engine of their
+  own that reuses its scaler.
+- Once the changes reach CATALOG_COMPACT_FRACTION (default 0.05) of the fitted recipes,
+  they are folded into a fully refitted engine on a background thread. The search index
+  is refitted reusing trained state where the backend allows (IVF keeps its centroids).
+- A changed CSV, or a truncated changes file, triggers a full reload from the CSV,
+  followed by a replay of the changes file.
+
+Either way the new engine is built off the request path and swapped in with
+``set_engine``. Requests already running keep the engine they started with, and the
+response cache is cleared after every swap.
+"""
+import json
+import logging
+import math
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+from .ingredients import IngredientIndex
+from .metrics import registry
+from .recipe_columns import RecipeColumns
+from .recommendation_engine import (RecommendationEngine, Recommender, backend_dir, find_recipes_csv, get_engine,
+                                    id_column, ingredient_column, load_recipes, metadata_columns, nutrition_features,
+                                    set_engine)
+from .response_cache import response_cache
+from .search_backends import MatmulBackend
+
+logger = logging.getLogger(__name__)
+
+
+def changes_path():
+    csv_path = find_recipes_csv()
+    default_dir = os.path.dirname(csv_path) if csv_path else os.path.join(backend_dir, 'datasets')
+    return os.environ.get('RECIPES_CHANGES_FILE') or os.path.join(default_dir, 'recipes_changes.jsonl')
+
+
+def recipes_frame(recipes):
+    """Validate recipes as sent to the admin API and return them as a DataFrame.
+
+    Every recipe needs a RecipeId and numeric values for all nutrition features; the
+    other result columns are optional. Raises ValueError with a client-facing message.
+    """
+    if not isinstance(recipes, list) or not all(isinstance(recipe, dict) for recipe in recipes):
+        raise ValueError('Expected a "recipes" list of recipe objects')
+    for recipe in recipes:
+        if recipe.get(id_column) in (None, ''):
+            raise ValueError(f'Every recipe needs a "{id_column}"')
+        try:
+            values = [float(recipe[feature]) for feature in nutrition_features]
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f'Recipe {recipe[id_column]} needs numeric values for {", ".join(nutrition_features)}')
+        if not all(math.isfinite(value) for value in values):
+            raise ValueError(f'Recipe {recipe[id_column]} has non-finite nutrition values')
+
+    columns = {column: [recipe.get(column) for recipe in recipes] for column in metadata_columns + [ingredient_column]}
+    columns[id_column] = [str(recipe[id_column]) for recipe in recipes]
+    for feature in nutrition_features:
+        columns[feature] = [float(recipe[feature]) for recipe in recipes]
+    return pd.DataFrame(columns)
+
+
+# Above this many removed recipes, searches skip them with a row subset instead of
+# fetching extra neighbors
+MAX_OVERFETCH = 1024
+
+
+class CatalogEngine(Recommender):
+    """A fitted engine with catalog changes layered on top of it, without refitting it.
+
+    Rows are numbered as the ``base`` engine's rows followed by the rows of ``added``, a
+    small engine over the recipes added since ``base`` was fitted, which reuses its scaler.
+    Base rows in the ``removed`` mask (tombstones) were removed or replaced, and are left
+    out of every search. ``base_rows`` maps recipe ids to base rows. It is built once per
+    base engine and shared by every later update, so an update looks up only the ids it
+    changes.
+    """
+
+    def __init__(self, base, removed=None, added=None, base_rows=None):
+        self.base = base
+        self.removed = np.zeros(len(base), dtype=bool) if removed is None else removed
+        self.added = added
+        if base_rows is None:
+            base_rows = {recipe_id: row for row, recipe_id in enumerate(base.metadata[id_column].take(range(len(base))))}
+        self.base_rows = base_rows
+        self.n_removed = int(np.count_nonzero(self.removed))
+        registry.set_gauge('inertiafit_catalog_recipes', len(self), 'Recipes in the search index')
+
+    def __len__(self):
+        return len(self.base) - self.n_removed + (len(self.added) if self.added is not None else 0)
+
+    def drift(self):
+        """Changed recipes as a fraction of the fitted ones; ``compacted`` resets it to 0."""
+        changed = self.n_removed + (len(self.added) if self.added is not None else 0)
+        return changed / len(self.base) if len(self.base) else float(changed > 0)
+
+    def updated(self, upserts, removed):
+        """Return a new engine with recipes upserted (``{id: recipe}``) and ids removed.
+
+        Costs O(changed and added recipes): base rows are only masked, and the added
+        recipes' engine is rebuilt with the base's fitted scaler.
+        """
+        changed = removed | upserts.keys()
+        tombstones = self.removed.copy()
+        tombstones[[self.base_rows[recipe_id] for recipe_id in changed if recipe_id in self.base_rows]] = True
+
+        # Previously added recipes that are still current, followed by the new ones
+        new = recipes_frame(list(upserts.values()))
+        names = self.base.metadata.names
+        if self.added is not None:
+            keep = [row for row, recipe_id in enumerate(self.added.metadata[id_column].take(range(len(self.added))))
+                    if recipe_id not in changed]
+            metadata = self.added.metadata.select(keep).appended(RecipeColumns.from_frame(new, names))
+            nutrients = np.concatenate([self.added.nutrients[keep], new[nutrition_features].to_numpy(dtype=float)])
+            ingredients = self.added.ingredients.select(keep).appended(new[ingredient_column])
+        else:
+            metadata = RecipeColumns.from_frame(new, names)
+            nutrients = new[nutrition_features].to_numpy(dtype=float)
+            ingredients = IngredientIndex.from_values(new[ingredient_column])
+        logger.info("Applying catalog changes: %d removed or replaced, %d added",
+                    int(np.count_nonzero(tombstones)) - self.n_removed, len(new))
+
+        added = None
+        if len(metadata):
+            added = RecommendationEngine(metadata, nutrients, ingredients, backend=MatmulBackend(), scaler=self.base.scaler)
+        return CatalogEngine(self.base, tombstones, added, self.base_rows)
+
+    def compacted(self):
+        """Return the same catalog as one refitted engine: new scaler, index and posting lists."""
+        keep = np.flatnonzero(~self.removed)
+        metadata = self.base.metadata.select(keep)
+        nutrients = np.asarray(self.base.nutrients)[keep]
+        ingredients = self.base.ingredients.select(keep)
+        if self.added is not None:
+            metadata = metadata.appended(self.added.metadata)
+            nutrients = np.concatenate([nutrients, self.added.nutrients])
+            ingredients = ingredients.extended(self.added.ingredients)
+        return CatalogEngine(RecommendationEngine(metadata, nutrients, ingredients, previous=self.base))
+
+    def candidate_mask(self, required=(), excluded=()):
+        """Boolean mask of live recipes matching the ingredient filters, or None when there are none."""
+        if not required and not excluded:
+            return None
+        masks = [self.base.candidate_mask(required, excluded) & ~self.removed]
+        if self.added is not None:
+            masks.append(self.added.candidate_mask(required, excluded))
+        return np.concatenate(masks)
+
+    def search(self, targets, k, candidates=None):
+        """Return (distances, row indices) of the k nearest live recipes, as ``RecommendationEngine.search``."""
+        targets = np.asarray(targets, dtype=float).reshape(-1, len(nutrition_features))
+        k = int(k)
+        n_base = len(self.base)
+        if candidates is not None:
+            distances, indices = self.base.search(targets, k, candidates[:n_base] & ~self.removed)
+        elif self.n_removed == 0:
+            distances, indices = self.base.search(targets, k)
+        elif self.n_removed <= MAX_OVERFETCH:
+            # Fetch enough extra neighbors that k remain once the removed rows are dropped;
+            # a stable sort moves them to the end and keeps the rest in distance order
+            distances, indices = self.base.search(targets, k + self.n_removed)
+            live = np.argsort(self.removed[indices], axis=1, kind='stable')[:, :min(k, n_base - self.n_removed)]
+            distances, indices = np.take_along_axis(distances, live, axis=1), np.take_along_axis(indices, live, axis=1)
+        else:
+            distances, indices = self.base.search(targets, k, ~self.removed)
+
+        if self.added is None:
+            return distances, indices
+        added_distances, added_indices = self.added.search(targets, k, None if candidates is None else candidates[n_base:])
+        distances = np.hstack([distances, added_distances])
+        indices = np.hstack([indices, added_indices + n_base])
+        nearest = np.argsort(distances, axis=1, kind='stable')[:, :k]
+        return np.take_along_axis(distances, nearest, axis=1), np.take_along_axis(indices, nearest, axis=1)
+
+    def _parts(self, rows):
+        # (positions in rows, engine, that engine's row ids) for the base and added rows,
+        # leaving out an engine with none of the rows
+        rows = np.asarray(rows, dtype=np.int64)
+        in_added = rows >= len(self.base)
+        parts = []
+        if not in_added.all():
+            parts.append((np.flatnonzero(~in_added), self.base, rows[~in_added]))
+        if in_added.any():
+            parts.append((np.flatnonzero(in_added), self.added, rows[in_added] - len(self.base)))
+        return parts
+
+    def records(self, rows):
+        records = [None] * len(rows)
+        for positions, engine, engine_rows in self._parts(rows):
+            for position, record in zip(positions.tolist(), engine.records(engine_rows)):
+                records[position] = record
+        return records
+
+    def explain(self, records, targets, rows, distances):
+        targets = np.asarray(targets, dtype=float)
+        distances = np.asarray(distances, dtype=float)
+        for positions, engine, engine_rows in self._parts(rows):
+            engine.explain([records[position] for position in positions], targets[positions], engine_rows,
+                           distances[positions])
+        return records
+
+    def nutrient_values(self, rows):
+        values = np.empty((len(rows), len(nutrition_features)))
+        for positions, engine, engine_rows in self._parts(rows):
+            values[positions] = engine.nutrient_values(engine_rows)
+        return values
+
+
+def net_changes(changes):
+    """Return (upserts by id, removed ids): the net effect of change records applied in order.
+
+    Records are ``{"op": "upsert", "recipes": [...]}`` or ``{"op": "remove", "ids": [...]}``.
+    The last record for an id wins.
+    """
+    upserts = {}
+    removed = set()
+    for change in changes:
+        try:
+            if change['op'] == 'upsert':
+                recipes_frame(change['recipes'])
+                for recipe in change['recipes']:
+                    removed.discard(str(recipe[id_column]))
+                    upserts[str(recipe[id_column])] = recipe
+            elif change['op'] == 'remove':
+                for recipe_id in map(str, change['ids']):
+                    upserts.pop(recipe_id, None)
+                    removed.add(recipe_id)
+            else:
+                raise ValueError(f"unknown op {change['op']!r}")
+        except (KeyError, TypeError, ValueError) as e:
+            # A hand-edited or damaged record must not block the changes after it
+            logger.warning("Skipping invalid catalog change %.200r: %s", change, e)
+    return upserts, removed
+
+
+def apply_changes(engine, changes):
+    """Return a new engine with the change records applied in order; ``engine`` is left untouched.
+
+    An updated recipe is removed from its old row and appended with its new values.
+    """
+    catalog = engine if isinstance(engine, CatalogEngine) else CatalogEngine(engine)
+    catalog = catalog.updated(*net_changes(changes))
+    # An empty base has no fitted scaler to share, so fit one to the whole catalog instead
+    return catalog.compacted() if catalog.base.scaler is None else catalog
+
+
+def _file_key(path):
+    try:
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+    except (OSError, TypeError):
+        return None
+
+
+def read_changes(path, offset):
+    """Return (change records, new offset) for the complete lines after byte ``offset``."""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+    except FileNotFoundError:
+        return [], offset
+    # A line still being appended has no newline yet; pick it up on the next sync
+    complete = data[:data.rfind(b'\n') + 1]
+    changes = []
+    for line in complete.splitlines():
+        try:
+            changes.append(json.loads(line))
+        except ValueError:
+            logger.warning("Skipping unreadable line in %s", path)
+    return changes, offset + len(complete)
+
+
+class CatalogWatcher:
+    """Keeps this process's engine in step with recipes.csv and the changes file."""
+
+    def __init__(self, interval, compact_fraction=0.05):
+        self.interval = float(interval)
+        self.compact_fraction = float(compact_fraction)
+        self.version = 0
+        self.last_sync = None
+        self.last_error = None
+        self._attached = False
+        self._csv_key = None
+        self._offset = 0
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._compacting = threading.Lock()
+        self._pid = None
+
+    def attach(self):
+        """Adopt the engine just loaded from the CSV, then replay the changes file onto it.
+
+        Under a preloading server this runs in the master process, so the recipe id map,
+        the replayed changes and any compaction are built once and shared by the workers.
+        """
+        with self._lock:
+            self._attached = True
+            self._csv_key = _file_key(find_recipes_csv())
+            self._offset = 0
+            engine = get_engine()
+            if not isinstance(engine, CatalogEngine):
+                set_engine(CatalogEngine(engine))
+        self.sync(compact_now=True)
+
+    def append(self, change):
+        """Validate a change record and append it to the changes file."""
+        if change['op'] == 'upsert':
+            recipes_frame(change['recipes'])
+        path = changes_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # One O_APPEND write per record, so lines from concurrent writers never interleave
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, (json.dumps(change) + '\n').encode('utf-8'))
+        finally:
+            os.close(fd)
+
+    def sync(self, full=False, compact_now=False):
+        """Bring the engine up to date with the CSV and the changes file; returns True if it was swapped.
+
+        When the changes have drifted past ``compact_fraction`` the engine is then compacted,
+        here with ``compact_now`` and otherwise on a background thread.
+        """
+        with self._lock:
+            if not self._attached:
+                return False  # the initial load is still running
+            start = time.perf_counter()
+            csv_key = _file_key(find_recipes_csv())
+            path = changes_path()
+            changes_key = _file_key(path)
+            # A changes file that shrank or disappeared was folded into the CSV or reset
+            full = full or csv_key != self._csv_key or (changes_key[0] if changes_key else 0) < self._offset
+
+            try:
+                if full:
+                    logger.info("Reloading the recipe catalog from the CSV")
+                    engine, offset = CatalogEngine(RecommendationEngine(*load_recipes())), 0
+                else:
+                    engine, offset = get_engine(), self._offset
+                changes, offset = read_changes(path, offset)
+                if changes:
+                    engine = apply_changes(engine, changes)
+            except Exception as e:
+                self.last_error = str(e)
+                raise
+            self._csv_key, self._offset = csv_key, offset
+            self.last_sync = time.time()
+            self.last_error = None
+            if not full and not changes:
+                return False
+
+            set_engine(engine)
+            response_cache.clear()
+            self.version += 1
+            elapsed = time.perf_counter() - start
+            registry.set_gauge('inertiafit_catalog_version', self.version, 'Catalog updates applied by this process')
+            registry.set_gauge('inertiafit_catalog_update_seconds', elapsed, 'Time spent building the last catalog update')
+            logger.info("Catalog updated to version %d with %d recipes in %.2fs", self.version, len(engine), elapsed)
+
+        if engine.drift() > self.compact_fraction:
+            if compact_now:
+                self.compact()
+            else:
+                threading.Thread(target=self._compact_logged, name='catalog-compact', daemon=True).start()
+        return True
+
+    def compact(self):
+        """Fold the layered changes into a refitted engine; returns True if it was swapped.
+
+        The refit runs without holding up syncs. If a sync swaps the engine meanwhile, the
+        result is dropped, and the next sync past the drift threshold compacts again.
+        """
+        if not self._compacting.acquire(blocking=False):
+            return False  # already compacting
+        try:
+            source = get_engine()
+            if not isinstance(source, CatalogEngine) or source.drift() <= self.compact_fraction:
+                return False
+            start = time.perf_counter()
+            logger.info("Compacting the recipe catalog (drift %.3f)", source.drift())
+            engine = source.compacted()
+            with self._lock:
+                if get_engine() is not source:
+                    logger.info("Catalog changed while compacting; dropping the compacted engine")
+                    return False
+                set_engine(engine)
+                response_cache.clear()
+            elapsed = time.perf_counter() - start
+            registry.set_gauge('inertiafit_catalog_compact_seconds', elapsed, 'Time spent compacting the catalog')
+            logger.info("Catalog compacted to %d recipes in %.2fs", len(engine), elapsed)
+            return True
+        finally:
+            self._compacting.release()
+
+    def sync_soon(self, full=False):
+        """Apply pending changes in the background, without waiting for the next poll."""
+        threading.Thread(target=self._sync_logged, args=(full,), name='catalog-sync', daemon=True).start()
+
+    def ensure_running(self):
+        # Started lazily in the serving process: a thread started before a fork would not
+        # survive it
+        if self.interval <= 0 or self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                threading.Thread(target=self._watch, name='catalog-watcher', daemon=True).start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.interval)
+            self._sync_logged()
+
+    def _sync_logged(self, full=False):
+        try:
+            self.sync(full)
+        except Exception:
+            logger.exception("Failed to update the recipe catalog")
+
+    def _compact_logged(self):
+        try:
+            self.compact()
+        except Exception:
+            logger.exception("Failed to compact the recipe catalog")
+
+    def status(self):
+        engine = get_engine()
+        return {
+            'recipes': len(engine),
+            'version': self.version,
+            'drift': round(engine.drift(), 4) if isinstance(engine, CatalogEngine) else 0.0,
+            'last_sync': self.last_sync,
+            'last_error': self.last_error,
+            'changes_file': changes_path(),
+            'watch_interval_seconds': self.interval,
+        }
+
+
+catalog_watcher = CatalogWatcher(os.environ.get('CATALOG_WATCH_INTERVAL', 5),
+                                 os.environ.get('CATALOG_COMPACT_FRACTION', 0.05))
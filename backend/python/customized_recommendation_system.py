@@ -1,52 +1,52 @@
-import os
 import numpy as np
-import pandas as pd
-from random import uniform as rnd
-from sklearn.neighbors import NearestNeighbors
-from sklearn.preprocessing import StandardScaler
-
-# Load Dataset with Error Handling
-try:
-    # Get the current directory
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    # Go up one level to the backend directory
-    backend_dir = os.path.dirname(current_dir)
-    # Construct the path to recipes.csv
-    file_path = os.path.join(backend_dir, "datasets", "recipes.csv")
-    
-    print(f"Attempting to load recipes from: {file_path}")
-    df = pd.read_csv(file_path, encoding='utf-8', engine='python')
-    print(f"Successfully loaded {len(df)} recipes")
-except Exception as e:
-    print(f"Error loading dataset: {e}")
-    exit()
-
-# Nutrition values used for recommendations
-nutrition_values = ['Calories', 'FatContent', 'SaturatedFatContent', 'CholesterolContent', 
-                    'SodiumContent', 'CarbohydrateContent', 'FiberContent', 'SugarContent', 'ProteinContent']
+from .ingredients import parse_ingredient_query
+from .recommendation_engine import get_engine
 
 # Class to generate food recommendations
 class Recommendation:
-    def __init__(self, nutrition_list, nb_recommendations, ingredient_txt):
+    def __init__(self, nutrition_list, nb_recommendations, ingredient_txt, excluded_ingredients=None, explain=False):
         self.nutrition_list = nutrition_list
         self.nb_recommendations = nb_recommendations
+        # Required ingredients ("eggs; brown sugar") and excluded ones such as allergens
         self.ingredient_txt = ingredient_txt
+        self.excluded_ingredients = excluded_ingredients
+        # Add each recipe's distance and nutrient deltas to the results
+        self.explain = explain
+
+    def candidates(self, engine):
+        # Restrict the search to recipes passing the ingredient filters, via the inverted index
+        return engine.candidate_mask(parse_ingredient_query(self.ingredient_txt),
+                                     parse_ingredient_query(self.excluded_ingredients))
+
+    def batchable(self):
+        # Micro-batched queries search the whole catalog and carry no explanations
+        return not (parse_ingredient_query(self.ingredient_txt) or parse_ingredient_query(self.excluded_ingredients)
+                    or self.explain)
+
+    def generate(self, batcher=None):
+        """Return the recommendations; a ``batcher`` (only when ``batchable``) runs the search with concurrent ones."""
+        # Query the shared index instead of refitting the scaler and KNN model per request
+        target_nutrition = np.array(self.nutrition_list, dtype=float)
+        if batcher is not None:
+            return batcher.recommend_batch(target_nutrition, self.nb_recommendations)[0]
+        engine = get_engine()
+        return engine.recommend(target_nutrition, self.nb_recommendations, self.candidates(engine), self.explain)
 
-    def generate(self):
-        df_filtered = df.dropna(subset=nutrition_values)
-        X = df_filtered[nutrition_values]
-        scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(X)
+    def ranking(self, depth):
+        """Return (engine, distances, row ids) of the ``depth`` closest matches, to page through with ``page``."""
+        engine = get_engine()
+        distances, indices = engine.search(np.array(self.nutrition_list, dtype=float), depth, self.candidates(engine))
+        return engine, distances[0], indices[0]
 
-        knn = NearestNeighbors(n_neighbors=self.nb_recommendations, metric='cosine')
-        knn.fit(X_scaled)
-        
-        target_nutrition = np.array(self.nutrition_list)
-        target_scaled = scaler.transform([target_nutrition])
-        distances, indices = knn.kneighbors(target_scaled)
-        
-        results = df_filtered.iloc[indices[0]].copy()
-        results['RecipeIngredientParts'] = results['RecipeIngredientParts'].apply(lambda x: ', '.join(eval(x)) if isinstance(x, str) and x.startswith('[') else x)
-        return results[['Name', 'Calories', 'RecipeIngredientParts', 'CookTime', 'PrepTime', 'TotalTime']].to_dict(orient='records')
+    def page(self, ranking, offset):
+        """Return the nb_recommendations results at ``offset`` of a ``ranking``, without searching again."""
+        engine, distances, indices = ranking
+        rows = indices[offset:offset + self.nb_recommendations]
+        records = engine.records(rows)
+        # A page past the end of the ranking has no rows to explain
+        if self.explain and len(rows):
+            targets = np.repeat(np.array(self.nutrition_list, dtype=float)[None, :], len(rows), axis=0)
+            engine.explain(records, targets, rows, distances[offset:offset + len(rows)])
+        return records
 
 # Remove the CLI input section since we'll be using the API
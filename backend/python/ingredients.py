@@ -0,0 +1,225 @@
+import ast
+import json
+import re
+import numpy as np
+
+# Quoted entries inside R-style c("a", "b") vectors (and single "a" values)
+_quoted = re.compile(r'"((?:[^"\\]|\\.)*)"')
+
+
+def parse_ingredient_parts(value):
+    """Parse a raw RecipeIngredientParts value into a list of ingredient names.
+
+    Handles the R-style ``c("a", "b")`` strings found in recipes.csv, single quoted
+    values, Python list literals and lists (as sent to the admin API), without calling ``eval``.
+    """
+    if isinstance(value, (list, tuple)):
+        return [str(part).strip() for part in value if part is not None and str(part).strip()]
+    if not isinstance(value, str):
+        return []
+    value = value.strip()
+    if value.startswith('['):
+        try:
+            parsed = ast.literal_eval(value)
+            return [str(part).strip() for part in parsed if part is not None and str(part).strip()]
+        except (ValueError, SyntaxError):
+            return []
+    parts = _quoted.findall(value)
+    if not parts and value and not value.startswith('c(') and value not in ('NA', 'character(0)'):
+        # Plain, unquoted single ingredient
+        parts = [value]
+    return [part.replace('\\"', '"').strip() for part in parts if part.strip()]
+
+
+class IngredientIndex:
+    """Ingredient lists for every recipe, interned into a shared vocabulary.
+
+    Recipe ``i`` owns ``ids[offsets[i]:offsets[i + 1]]``, which index into ``vocabulary``.
+    """
+
+    def __init__(self, vocabulary, offsets, ids):
+        self.vocabulary = list(vocabulary)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.ids = np.asarray(ids, dtype=np.int32)
+
+    @classmethod
+    def from_values(cls, values, vocabulary=()):
+        """Parse raw RecipeIngredientParts values once and intern every ingredient name.
+
+        An existing ``vocabulary`` keeps its ids, and new names are appended after it.
+        """
+        vocabulary = list(vocabulary)
+        vocab_ids = {name: i for i, name in enumerate(vocabulary)}
+        parsed_cache = {}
+        offsets = [0]
+        ids = []
+        for value in values:
+            # Identical raw strings are common, so parse each distinct one only once; lists
+            # (as sent to the admin API) are parsed every time
+            key = value if isinstance(value, str) else None
+            row_ids = parsed_cache.get(key) if key is not None else None
+            if row_ids is None:
+                row_ids = []
+                for part in parse_ingredient_parts(value):
+                    ingredient_id = vocab_ids.get(part)
+                    if ingredient_id is None:
+                        ingredient_id = vocab_ids[part] = len(vocabulary)
+                        vocabulary.append(part)
+                    row_ids.append(ingredient_id)
+                if key is not None:
+                    parsed_cache[key] = row_ids
+            ids.extend(row_ids)
+            offsets.append(len(ids))
+        return cls(vocabulary, offsets, ids)
+
+    @classmethod
+    def empty(cls):
+        return cls([], [0], [])
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def select(self, rows):
+        """Return a new index holding only the given rows, in that order."""
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = self.offsets[rows]
+        counts = self.offsets[rows + 1] - starts
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        positions = np.repeat(starts - offsets[:-1], counts) + np.arange(offsets[-1], dtype=np.int64)
+        return IngredientIndex(self.vocabulary, offsets, self.ids[positions])
+
+    def appended(self, values):
+        """Return a new index with rows parsed from raw values added at the end.
+
+        The vocabulary only grows, so the ids of existing rows stay valid.
+        """
+        added = IngredientIndex.from_values(values, self.vocabulary)
+        return IngredientIndex(added.vocabulary, np.concatenate([self.offsets, added.offsets[1:] + self.offsets[-1]]),
+                               np.concatenate([self.ids, added.ids]))
+
+    def extended(self, other):
+        """Return a new index with the rows of another index added at the end.
+
+        Names from ``other`` are interned into this vocabulary, so existing ids stay valid.
+        """
+        vocabulary = list(self.vocabulary)
+        vocab_ids = {name: i for i, name in enumerate(vocabulary)}
+        remap = np.empty(len(other.vocabulary), dtype=np.int32)
+        for i, name in enumerate(other.vocabulary):
+            ingredient_id = vocab_ids.get(name)
+            if ingredient_id is None:
+                ingredient_id = vocab_ids[name] = len(vocabulary)
+                vocabulary.append(name)
+            remap[i] = ingredient_id
+        return IngredientIndex(vocabulary, np.concatenate([self.offsets, other.offsets[1:] + self.offsets[-1]]),
+                               np.concatenate([self.ids, remap[np.asarray(other.ids, dtype=np.int64)]]))
+
+    def ingredient_ids(self, row):
+        return self.ids[self.offsets[row]:self.offsets[row + 1]]
+
+    def ingredients(self, row):
+        vocabulary = self.vocabulary
+        return [vocabulary[i] for i in self.ingredient_ids(row)]
+
+    def joined(self, row):
+        """Return the comma-separated ingredient string sent to the frontend."""
+        return ', '.join(self.ingredients(row))
+
+    def save(self, prefix):
+        np.save(prefix + '_offsets.npy', self.offsets)
+        np.save(prefix + '_ids.npy', self.ids)
+        with open(prefix + '_vocabulary.json', 'w') as f:
+            json.dump(self.vocabulary, f)
+
+    @classmethod
+    def load(cls, prefix, mmap_mode='r'):
+        with open(prefix + '_vocabulary.json') as f:
+            vocabulary = json.load(f)
+        return cls(vocabulary, np.load(prefix + '_offsets.npy', mmap_mode=mmap_mode),
+                   np.load(prefix + '_ids.npy', mmap_mode=mmap_mode))
+
+
+_token_pattern = re.compile(r'[a-z0-9]+')
+
+
+def normalize_token(token):
+    # Fold simple plurals so "eggs" matches "egg"
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    return [normalize_token(token) for token in _token_pattern.findall(text.lower())]
+
+
+def parse_ingredient_query(value):
+    """Split a user ingredient filter (text separated by ';' or ',', or a list) into phrases."""
+    if not value:
+        return []
+    parts = re.split(r'[;,\n]', value) if isinstance(value, str) else [str(part) for part in value]
+    return [part.strip() for part in parts if tokenize(part)]
+
+
+class InvertedIngredientIndex:
+    """Inverted indexes from ingredient tokens to ingredients, and from ingredients to recipes.
+
+    A phrase such as "brown sugar" matches the ingredients whose names contain all of its
+    tokens, and then every recipe using one of those ingredients. The tokens must appear
+    together in a single ingredient, so "cream cheese" does not match a recipe with only
+    "sour cream" and "cheddar cheese". Filters are resolved as boolean masks over the
+    recipe rows, so no per-request string matching is needed.
+    """
+
+    def __init__(self, ingredients):
+        self.n_recipes = n_recipes = len(ingredients)
+
+        # Token -> sorted ids of the vocabulary entries containing it; the vocabulary is
+        # small next to the recipes, so this is tokenized once per name
+        token_ingredients = {}
+        for ingredient_id, name in enumerate(ingredients.vocabulary):
+            for token in set(tokenize(name)):
+                token_ingredients.setdefault(token, []).append(ingredient_id)
+        self.token_ingredients = {token: np.asarray(ids, dtype=np.int64) for token, ids in token_ingredients.items()}
+
+        # Sort unique (ingredient, recipe) pairs by ingredient, then recipe, and store them
+        # as posting lists: ingredient j is used by recipe_ids[offsets[j]:offsets[j + 1]]
+        ids = np.asarray(ingredients.ids, dtype=np.int64)
+        entry_rows = np.repeat(np.arange(n_recipes, dtype=np.int64), np.diff(ingredients.offsets))
+        stride = max(n_recipes, 1)
+        pairs = np.unique(ids * stride + entry_rows)
+        self.offsets = np.searchsorted(pairs // stride, np.arange(len(ingredients.vocabulary) + 1))
+        self.recipe_ids = (pairs % stride).astype(np.int32)
+
+    def phrase_ingredients(self, phrase):
+        """Sorted vocabulary ids of the ingredients containing every token of phrase."""
+        matches = None
+        for token in set(tokenize(phrase)):
+            token_matches = self.token_ingredients.get(token, np.empty(0, dtype=np.int64))
+            matches = token_matches if matches is None else np.intersect1d(matches, token_matches, assume_unique=True)
+        return matches
+
+    def phrase_mask(self, phrase):
+        """Boolean mask of recipes using an ingredient that contains every token of phrase."""
+        ingredient_ids = self.phrase_ingredients(phrase)
+        if ingredient_ids is None:
+            return np.ones(self.n_recipes, dtype=bool)
+        # Union of the matching ingredients' posting lists, gathered in one step
+        starts = self.offsets[ingredient_ids]
+        counts = self.offsets[ingredient_ids + 1] - starts
+        positions = np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum(), dtype=np.int64)
+        mask = np.zeros(self.n_recipes, dtype=bool)
+        mask[self.recipe_ids[positions]] = True
+        return mask
+
+    def candidate_mask(self, required=(), excluded=()):
+        """Return the mask of recipes using every required and no excluded phrase, or None if unfiltered."""
+        if not required and not excluded:
+            return None
+        mask = np.ones(self.n_recipes, dtype=bool)
+        for phrase in required:
+            mask &= self.phrase_mask(phrase)
+        for phrase in excluded:
+            mask &= ~self.phrase_mask(phrase)
+        return mask
@@ -0,0 +1,24 @@
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_compact_separators = (',', ':')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes with orjson when it is installed.
+
+    Output is compact with sorted keys either way, so the same response always has the
+    same body. Calls with other ``json.dumps`` options (such as the indented output of
+    debug mode) use the standard library encoder.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and kwargs.keys() <= {'separators'} and kwargs.get('separators', _compact_separators) == _compact_separators:
+            option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if self.sort_keys else 0)
+            return orjson.dumps(obj, default=self.default, option=option).decode()
+        kwargs.setdefault('separators', _compact_separators)
+        return super().dumps(obj, **kwargs)
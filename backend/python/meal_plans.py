@@ -0,0 +1,134 @@
+"""Multi-day meal plans that hit a person's daily macro targets without repeating recipes.
+
+Planning runs in three vectorized steps:
+
+1. Candidates: one neighbor query retrieves the ``candidates`` recipes closest to each
+   meal's target nutrition profile (the same targets /api/nutrition uses).
+2. Day combinations: a beam search adds one meal at a time to partial days, scoring every
+   partial sum against the share of the daily targets it should cover, and keeps the
+   ``beam_width`` best. The final step scores every surviving (breakfast, lunch, dinner)
+   combination against the full daily calories, protein, carbs and fats.
+3. Days: each day takes the best-scoring combination that reuses no recipe from the
+   previous ``repeat_window - 1`` days. When every surviving combination does, the beam
+   search runs again with those recipes left out of the candidates.
+
+A combination's score is its largest relative deviation from the daily targets, so a day
+is within ``tolerance`` exactly when every macro is.
+"""
+import numpy as np
+from .metrics import stage
+from .recommendation_engine import nutrition_features
+from .target_profiles import build_target_nutrition
+
+# Daily targets from Person.calculate_macros and the recipe column each is summed from
+macro_columns = {'calories': 'Calories', 'protein': 'ProteinContent', 'carbs': 'CarbohydrateContent', 'fats': 'FatContent'}
+
+
+def macro_values(engine, rows):
+    """Return the macro columns (in ``macro_columns`` order) of the given rows as floats."""
+    columns = [nutrition_features.index(column) for column in macro_columns.values()]
+    return engine.nutrient_values(np.asarray(rows).ravel())[:, columns].reshape(np.shape(rows) + (len(columns),))
+
+
+def rank_day_combinations(pools, values, daily_targets, shares, beam_width=1024, excluded=()):
+    """Beam search over one candidate per meal.
+
+    ``pools`` is (meals, candidates) of row ids with their macros in ``values`` (meals,
+    candidates, macros), and ``shares`` is each meal's share of the daily targets. Returns
+    (combinations, scores): row ids per meal for the ``beam_width`` best combinations,
+    best first. No combination uses a recipe twice, or any of the ``excluded`` row ids.
+    """
+    cumulative = np.cumsum(shares) / np.sum(shares)
+    blocked = np.isin(pools, np.asarray(excluded, dtype=pools.dtype))
+    rows = np.zeros((1, 0), dtype=np.int64)
+    sums = np.zeros((1, values.shape[2]))
+    for meal in range(len(pools)):
+        # Score every partial day extended with every candidate for this meal, as a
+        # (partial days, candidates) grid
+        extended = sums[:, None, :] + values[meal][None, :, :]
+        scores = np.abs(extended / (daily_targets * cumulative[meal]) - 1).max(axis=2)
+        scores[(rows[:, :, None] == pools[meal][None, None, :]).any(axis=1)] = np.inf
+        scores[:, blocked[meal]] = np.inf
+
+        # Keep the best, and build row ids only for those
+        scores = scores.ravel()
+        keep = np.flatnonzero(np.isfinite(scores))
+        if len(keep) > beam_width:
+            keep = keep[np.argpartition(scores[keep], beam_width)[:beam_width]]
+        keep = keep[np.argsort(scores[keep], kind='stable')]
+        parents, chosen = np.divmod(keep, pools.shape[1])
+        rows = np.hstack([rows[parents], pools[meal][chosen][:, None]])
+        sums = extended.reshape(-1, values.shape[2])[keep]
+        scores = scores[keep]
+    return rows, scores
+
+
+def choose_days(combinations, scores, days, repeat_window, rerank=None):
+    """Pick one combination per day from ``combinations``, sorted best first with their ``scores``.
+
+    Each day takes the best combination that shares no recipe with the previous
+    ``repeat_window - 1`` days. When every combination does, ``rerank(excluded rows)``
+    is asked for (combinations, scores) without those recipes. Only if that finds none
+    either does the day take the combination with the fewest repeats. Returns (rows per
+    day, scores, repeated recipes per day).
+    """
+    chosen, chosen_scores, repeats = [], [], []
+    for day in range(days):
+        recent = np.concatenate(chosen[max(0, day - repeat_window + 1):] or [np.empty(0, dtype=combinations.dtype)])
+        repeated = np.isin(combinations, recent).sum(axis=1)
+        best = int(np.argmin(repeated))
+        if repeated[best] and rerank is not None:
+            reranked, reranked_scores = rerank(recent)
+            if len(reranked):
+                combinations, scores, repeated, best = reranked, reranked_scores, np.zeros(len(reranked), dtype=int), 0
+        chosen.append(combinations[best])
+        chosen_scores.append(scores[best])
+        repeats.append(int(repeated[best]))
+    return np.array(chosen), np.array(chosen_scores), repeats
+
+
+def plan_meals(engine, macros, meal_calories, days=7, repeat_window=None, tolerance=0.1, candidates=200,
+               beam_width=1024, seed=None):
+    """Return a ``days`` long meal plan for daily ``macros`` split into ``meal_calories``.
+
+    ``repeat_window`` (default: the whole plan) is the number of consecutive days in which
+    no recipe appears twice. Returns one entry per day with its recipes, macro totals and
+    whether every total is within ``tolerance`` of its target, or an empty list when the
+    catalog has no recipes.
+    """
+    repeat_window = days if repeat_window is None else repeat_window
+    meals = list(meal_calories)
+    daily_targets = np.maximum([float(macros[macro]) for macro in macro_columns], 1.0)
+
+    with stage('targets'):
+        targets = build_target_nutrition(list(meal_calories.values()), seed=seed)
+    # Enough candidates per meal that a full window can go without repeats
+    _, pools = engine.search(targets, max(candidates, 2 * min(days, repeat_window)))
+    if pools.shape[1] == 0:
+        return []
+
+    with stage('plan'):
+        values = macro_values(engine, pools)
+        shares = list(meal_calories.values())
+        combinations, scores = rank_day_combinations(pools, values, daily_targets, shares, beam_width)
+        if len(combinations) == 0:
+            return []
+        # Later days continue the best combinations; a day whose every combination reuses
+        # a recent recipe searches again, later days then continuing from that search
+        chosen, chosen_scores, repeats = choose_days(
+            combinations, scores, days, repeat_window,
+            lambda excluded: rank_day_combinations(pools, values, daily_targets, shares, beam_width, excluded))
+        totals = macro_values(engine, chosen).sum(axis=1)
+
+    records = engine.records(chosen.ravel())
+    plan = []
+    for day, (score, day_totals, day_repeats) in enumerate(zip(chosen_scores, totals, repeats)):
+        plan.append({
+            'day': day + 1,
+            'meals': dict(zip(meals, records[day * len(meals):(day + 1) * len(meals)])),
+            'totals': {macro: round(float(total), 1) for macro, total in zip(macro_columns, day_totals)},
+            'deviation': round(float(score), 4),
+            'within_tolerance': bool(score <= tolerance),
+            'repeats': day_repeats,
+        })
+    return plan
@@ -0,0 +1,147 @@
+import bisect
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from 100us to 10s
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Add a Server-Timing header with the per-stage durations to every API response
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '').lower() in ('1', 'true', 'yes')
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        # Caller holds the registry lock
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + '}'
+
+
+class MetricsRegistry:
+    """Counters, gauges and histograms rendered in the Prometheus text format.
+
+    Metrics are created on first use; ``collectors`` are called at render time for
+    values owned elsewhere (such as response cache counters).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}  # name -> (type, help, {labels: value or Histogram})
+        self._collectors = []
+
+    def _series(self, name, kind, help_text):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = (kind, help_text, {})
+        return metric[2]
+
+    def inc(self, name, value=1, help_text='', **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series(name, 'counter', help_text)
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name, value, help_text='', **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._series(name, 'gauge', help_text)[key] = value
+
+    def observe(self, name, value, help_text='', **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series(name, 'histogram', help_text)
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    def register_collector(self, collector):
+        """collector() returns an iterable of (name, type, help, [(labels dict, value)])."""
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            metrics = [(name, kind, help_text, list(series.items())) for name, (kind, help_text, series) in sorted(self._metrics.items())]
+            for name, kind, help_text, series in metrics:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in series:
+                    if kind != 'histogram':
+                        lines.append(f'{name}{_format_labels(labels)} {value}')
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(value.buckets + (float('inf'),), value.counts):
+                        cumulative += count
+                        le = '+Inf' if bound == float('inf') else repr(bound)
+                        lines.append(f'{name}_bucket{_format_labels(labels + (("le", le),))} {cumulative}')
+                    lines.append(f'{name}_sum{_format_labels(labels)} {value.sum}')
+                    lines.append(f'{name}_count{_format_labels(labels)} {value.count}')
+
+        for collector in self._collectors:
+            for name, kind, help_text, samples in collector():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_format_labels(tuple(sorted(labels.items())))} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+# Endpoint label and per-request stage durations for the request being handled
+_current_endpoint = contextvars.ContextVar('metrics_endpoint', default='none')
+_current_timings = contextvars.ContextVar('metrics_timings', default=None)
+
+
+def begin_request(endpoint):
+    """Start collecting stage timings for a request; returns a token for end_request."""
+    return _current_endpoint.set(endpoint), _current_timings.set([])
+
+
+def end_request(tokens):
+    """Stop collecting and return the request's [(stage, seconds)] list."""
+    endpoint_token, timings_token = tokens
+    timings = _current_timings.get()
+    _current_endpoint.reset(endpoint_token)
+    _current_timings.reset(timings_token)
+    return timings or []
+
+
+@contextmanager
+def stage(name):
+    """Time a block as one stage of the current request (or of startup, outside requests)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        registry.observe('inertiafit_stage_seconds', elapsed, 'Latency of each request stage in seconds',
+                         endpoint=_current_endpoint.get(), stage=name)
+        timings = _current_timings.get()
+        if timings is not None:
+            timings.append((name, elapsed))
+
+
+def server_timing_header(timings):
+    """Format [(stage, seconds)] as a Server-Timing header value, summing repeated stages."""
+    totals = {}
+    for name, seconds in timings:
+        totals[name] = totals.get(name, 0.0) + seconds
+    return ', '.join(f'{name};dur={seconds * 1000.0:.3f}' for name, seconds in totals.items())
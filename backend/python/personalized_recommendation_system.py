@@ -1,122 +1,128 @@
-import pandas as pd
+"""Bulk meal-plan generation for many users, streamed from and to disk.
+
+Reads user profiles from a CSV or JSONL file in chunks, computes every profile's
+calorie and meal targets in vectorized form, resolves all meals of a chunk with one
+query against the shared recommendation index, and writes one JSON plan per line in
+the same shape as /api/nutrition. Memory stays bounded by the chunk size.
+
+Usage (from the backend directory)::
+
+    python -m python.personalized_recommendation_system users.jsonl -o plans.jsonl --workers 8
+
+Profile fields use the /api/nutrition names (age, height, weight, gender,
+activityLevel, weightGoal); an ``id`` or ``user_id`` column is copied to the output.
+"""
+import argparse
+import json
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-from random import uniform as rnd
-from sklearn.neighbors import NearestNeighbors
-from sklearn.preprocessing import StandardScaler
-
-# Load Dataset
-df = pd.read_csv("inertiafit\backend\datasets\recipes.csv")
-
-# Nutrition values used for food recommendations
-nutrition_features = ['Calories', 'FatContent', 'SaturatedFatContent', 'CholesterolContent', 'SodiumContent', 
-                      'CarbohydrateContent', 'FiberContent', 'SugarContent', 'ProteinContent']
-
-# Person class for health calculations
-class Person:
-    def __init__(self, age, height, weight, gender, activity, meals_calories_perc, weight_loss):
-        self.age = age
-        self.height = height
-        self.weight = weight
-        self.gender = gender
-        self.activity = activity
-        self.meals_calories_perc = meals_calories_perc
-        self.weight_loss = weight_loss
-
-    def calculate_bmi(self):
-        return round(self.weight / ((self.height / 100) ** 2), 2)
-
-    def display_result(self):
-        bmi = self.calculate_bmi()
-        category = ('Underweight' if bmi < 18.5 else 'Normal' if bmi < 25 else 'Overweight' if bmi < 30 else 'Obesity')
-        return bmi, category
-
-    def calculate_bmr(self):
-        return 10 * self.weight + 6.25 * self.height - 5 * self.age + (5 if self.gender == 'Male' else -161)
-
-    def calories_calculator(self):
-        activity_levels = ['Little/no exercise', 'Light exercise', 'Moderate exercise (3-5 days/wk)', 
-                           'Very active (6-7 days/wk)', 'Extra active (very active & physical job)']
-        weights = [1.2, 1.375, 1.55, 1.725, 1.9]
-        return self.calculate_bmr() * weights[activity_levels.index(self.activity)]
-
-    def generate_recommendations(self):
-        total_calories = self.weight_loss * self.calories_calculator()
-        recommendations = {}
-
-        for meal, perc in self.meals_calories_perc.items():
-            meal_calories = perc * total_calories
-            recommendations[meal] = get_recommended_recipes(df, meal_calories)
-
-        return recommendations
-
-# ML Model for food recommendation using KNN
-def get_recommended_recipes(df, meal_calories, top_n=3):
-    df_filtered = df.dropna(subset=nutrition_features)
-    X = df_filtered[nutrition_features]
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
-    
-    knn = NearestNeighbors(n_neighbors=top_n, metric='cosine')
-    knn.fit(X_scaled)
-    
-    target_nutrition = np.array([meal_calories, rnd(10, 40), rnd(0, 4), rnd(0, 30), rnd(0, 400), rnd(40, 75), rnd(4, 20), rnd(0, 10), rnd(30, 175)])
-    target_scaled = scaler.transform([target_nutrition])
-    
-    distances, indices = knn.kneighbors(target_scaled)
-    recommendations = df_filtered.iloc[indices[0]][['Name', 'Calories', 'RecipeIngredientParts', 'CookTime', 'PrepTime', 'TotalTime']]
-    
-    return recommendations.to_dict(orient='records')
-
-# CLI Input
-age = int(input("Enter your age: "))
-height = int(input("Enter your height (cm): "))
-weight = float(input("Enter your weight (kg): "))
-gender = input("Enter your gender (Male/Female): ")
-
-activity_levels = ['Little/no exercise', 'Light exercise', 'Moderate exercise (3-5 days/wk)', 'Very active (6-7 days/wk)', 'Extra active (very active & physical job)']
-print("Select activity level:")
-for i, level in enumerate(activity_levels, 1):
-    print(f"{i}. {level}")
-
-while True:
-    try:
-        choice = int(input("Enter choice (1-5): ").strip())
-        if 1 <= choice <= 5:
-            activity = activity_levels[choice - 1]
-            break
-        else:
-            print("Invalid choice. Please enter a number between 1 and 5.")
-    except ValueError:
-        print("Invalid input. Please enter a numeric value.")
-
-weight_loss_dict = {"Maintain": 1, "Mild Weight Loss": 0.9, "Weight Loss": 0.8, "Extreme Weight Loss": 0.6}
-print("Select weight goal:")
-for i, goal in enumerate(weight_loss_dict.keys(), 1):
-    print(f"{i}. {goal}")
-
-while True:
-    try:
-        choice = int(input("Enter choice (1-4): ").strip())
-        if 1 <= choice <= 4:
-            weight_loss = weight_loss_dict[list(weight_loss_dict.keys())[choice - 1]]
-            break
-        else:
-            print("Invalid choice. Please enter a number between 1 and 4.")
-    except ValueError:
-        print("Invalid input. Please enter a numeric value.")
-
-meals_calories_perc = {'breakfast': 0.30, 'lunch': 0.40, 'dinner': 0.30}
-
-# Generate Recommendations
-person = Person(age, height, weight, gender, activity, meals_calories_perc, weight_loss)
-bmi, category = person.display_result()
-print(f"\nYour BMI: {bmi} kg/m² - Category: {category}")
-print(f"Maintenance Calories: {round(person.calories_calculator(), 2)} kcal/day")
-
-recommendations = person.generate_recommendations()
-for meal, recipes in recommendations.items():
-    print(f"\nRecommended {meal.capitalize()} Recipes:")
-    for recipe in recipes:
-        print(f"- {recipe['Name']} ({recipe['Calories']} kcal)")
-        print(f"  Ingredients: {recipe['RecipeIngredientParts'] if isinstance(recipe['RecipeIngredientParts'], str) else 'N/A'}")
-        print(f"  Cook Time: {recipe.get('CookTime', 'N/A')} | Prep Time: {recipe.get('PrepTime', 'N/A')} | Total Time: {recipe.get('TotalTime', 'N/A')}")
+import pandas as pd
+from .app_logging import configure_logging
+from .population import calculate_frame, meal_calories
+from .recommendation_engine import get_engine
+from .target_profiles import build_target_nutrition
+
+logger = logging.getLogger(__name__)
+
+id_columns = ['id', 'user_id']
+
+
+def read_profile_chunks(path, chunksize):
+    """Yield DataFrames of at most chunksize profiles from a CSV or JSONL file."""
+    if path.endswith(('.jsonl', '.json')):
+        yield from pd.read_json(path, lines=True, chunksize=chunksize)
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize)
+
+
+def plan_chunk(chunk, top_n=3, seed=None):
+    """Return the JSONL lines of meal plans for one chunk of profiles."""
+    stats = calculate_frame(chunk)
+    meals = meal_calories(stats['calories'].to_numpy())
+    meal_names = list(meals)
+
+    # One (profiles x meals, 9) target matrix, resolved in a single neighbor query
+    per_meal = np.column_stack([meals[meal] for meal in meal_names]).reshape(-1)
+    recipes = get_engine().recommend_batch(build_target_nutrition(per_meal, seed=seed), top_n)
+
+    id_column = next((column for column in id_columns if column in chunk.columns), None)
+    ids = chunk[id_column].tolist() if id_column else None
+    lines = []
+    for i, row in enumerate(stats.itertuples(index=False)):
+        plan = {
+            "bmi": str(float(row.bmi)),
+            "category": row.category,
+            "calories": int(row.calories),
+            "protein": int(row.protein),
+            "carbs": int(row.carbs),
+            "fats": int(row.fats),
+            "recipes": {meal: recipes[i * len(meal_names) + j] for j, meal in enumerate(meal_names)},
+        }
+        if ids is not None:
+            plan[id_column] = ids[i]
+        lines.append(json.dumps(plan, default=str))
+    return lines
+
+
+def _init_worker():
+    # Load the cached dataset and index once per worker process
+    configure_logging()
+    get_engine()
+
+
+def _plan_chunk_task(args):
+    return plan_chunk(*args)
+
+
+def _write_lines(output, lines):
+    if lines:
+        output.write('\n'.join(lines) + '\n')
+    return len(lines)
+
+
+def generate_plans(input_path, output, chunksize=10000, top_n=3, seed=None, workers=1):
+    """Stream plans for every profile in input_path to the output file object; returns the row count."""
+    chunks = read_profile_chunks(input_path, chunksize)
+    # Chunk i uses seed + i, so seeded runs are reproducible for any worker count
+    tasks = ((chunk, top_n, None if seed is None else seed + i) for i, chunk in enumerate(chunks))
+    rows = 0
+
+    if workers <= 1:
+        for task in tasks:
+            rows += _write_lines(output, _plan_chunk_task(task))
+        return rows
+
+    # Keep at most 2 chunks per worker in flight and write results in input order
+    get_engine()  # built before forking, so fork-based workers inherit it
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        pending = []
+        for task in tasks:
+            pending.append(pool.submit(_plan_chunk_task, task))
+            if len(pending) >= 2 * workers:
+                rows += _write_lines(output, pending.pop(0).result())
+        for future in pending:
+            rows += _write_lines(output, future.result())
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate meal plans for many users from a CSV or JSONL file")
+    parser.add_argument('input', help='CSV or JSONL file of user profiles')
+    parser.add_argument('-o', '--output', required=True, help='JSONL output file')
+    parser.add_argument('--chunksize', type=int, default=10000, help='profiles per chunk')
+    parser.add_argument('--top-n', type=int, default=3, help='recipes per meal')
+    parser.add_argument('--seed', type=int, default=None, help='sample targets reproducibly instead of using range midpoints')
+    parser.add_argument('--workers', type=int, default=1, help='worker processes')
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    start = time.perf_counter()
+    with open(args.output, 'w') as output:
+        rows = generate_plans(args.input, output, args.chunksize, args.top_n, args.seed, args.workers)
+    logger.info("Generated %d meal plans in %.1fs", rows, time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""Vectorized counterpart of ``Person`` for population-scale calculations.
+
+``calculate_population`` takes columnar arrays and returns the same BMI, category,
+calorie and macro values as ``Person.display_result`` and ``Person.calculate_macros``,
+one array element per person.
+
+Bulk CLI (from the backend directory)::
+
+    python -m python.population users.csv -o results.csv
+    python -m python.population users.parquet -o results.parquet
+
+Input columns use the /api/nutrition field names: age, height, weight, gender,
+activityLevel and weightGoal.
+"""
+import argparse
+import os
+import numpy as np
+import pandas as pd
+
+# Activity levels, matched by case-insensitive substring in this order, and TDEE multipliers
+activity_levels = ['Little/no exercise', 'Light exercise', 'Moderate exercise', 'Heavy exercise', 'Very heavy exercise']
+activity_multipliers = np.array([1.2, 1.375, 1.55, 1.725, 1.9])
+
+# Weight goals by code; unknown goals are treated as Maintain
+weight_goals = ['Lose', 'Maintain', 'Gain']
+MAINTAIN = 1
+goal_calorie_multipliers = np.array([0.8, 1.0, 1.2])
+# Grams per kg of body weight, mirroring Person.calculate_macros
+goal_protein_per_kg = np.array([1.6, 1.2, 2.2])
+goal_fat_per_kg = np.array([0.5, 0.8, 1.0])
+
+bmi_categories = np.array(['Underweight', 'Normal weight', 'Overweight', 'Obesity'], dtype=object)
+meals_calories_perc = {'breakfast': 0.30, 'lunch': 0.40, 'dinner': 0.30}
+
+
+def activity_code(activity):
+    """Scalar activity matching used by Person: first level contained in the text, else 0."""
+    activity = str(activity).lower()
+    for i, level in enumerate(activity_levels):
+        if level.lower() in activity:
+            return i
+    return 0
+
+
+def _encode(values, encode_one):
+    # Encode each distinct value once, then broadcast back
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.integer):
+        return values.astype(np.int64)
+    uniques, inverse = np.unique(values.astype(str), return_inverse=True)
+    return np.array([encode_one(value) for value in uniques], dtype=np.int64)[inverse].reshape(values.shape)
+
+
+def encode_activity(activity):
+    """Map activity strings (or pass through integer codes 0-4) to activity codes."""
+    return _encode(activity, activity_code)
+
+
+def encode_goal(goal):
+    """Map weight goal strings (or pass through integer codes) to goal codes."""
+    return _encode(goal, lambda value: weight_goals.index(value) if value in weight_goals else MAINTAIN)
+
+
+def _round_like_python(values, digits):
+    # np.round scales by 10**digits, which can break exact-half ties differently from
+    # Python's correctly rounded round(); recompute the rare near-tie elements exactly
+    rounded = np.round(values, digits)
+    scaled = values * 10 ** digits
+    near_tie = np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) < 1e-6
+    for i in np.flatnonzero(near_tie):
+        rounded.flat[i] = round(float(values.flat[i]), digits)
+    return rounded
+
+
+def calculate_population(age, height, weight, gender, activity, goal):
+    """Return a dict of per-person arrays: bmi, category, bmr, tdee, calories, protein, carbs, fats.
+
+    ``gender`` is an array of strings ('Male' is male, anything else female) or booleans
+    (True for male). ``activity`` and ``goal`` are strings or integer codes, see
+    ``encode_activity`` and ``encode_goal``.
+    """
+    age = np.asarray(age)
+    height = np.asarray(height)
+    weight = np.asarray(weight, dtype=float)
+    gender = np.asarray(gender)
+    is_male = gender if gender.dtype == bool else gender == 'Male'
+    activity = encode_activity(activity)
+    goal = encode_goal(goal)
+
+    bmi = _round_like_python(weight / ((height / 100) ** 2), 2)
+    category = bmi_categories[np.select([bmi < 18.5, bmi < 25, bmi < 30], [0, 1, 2], 3)]
+
+    # Mifflin-St Jeor Equation, in the same operation order as Person.calculate_bmr
+    bmr = 10 * weight + 6.25 * height - 5 * age + np.where(is_male, 5, -161)
+    tdee = bmr * activity_multipliers[activity]
+    calories = np.rint(goal_calorie_multipliers[goal] * tdee).astype(np.int64)
+
+    protein = np.rint(weight * goal_protein_per_kg[goal]).astype(np.int64)
+    fats = np.rint(weight * goal_fat_per_kg[goal]).astype(np.int64)
+    carbs = np.rint((calories - (protein * 4 + fats * 9)) / 4).astype(np.int64)
+
+    return {'bmi': bmi, 'category': category, 'bmr': bmr, 'tdee': tdee,
+            'calories': calories, 'protein': protein, 'carbs': carbs, 'fats': fats}
+
+
+def meal_calories(calories):
+    """Per-meal calorie targets, as Person.meal_calories: {meal: int array}."""
+    calories = np.asarray(calories)
+    return {meal: np.rint(calories * perc).astype(np.int64) for meal, perc in meals_calories_perc.items()}
+
+
+def calculate_frame(df):
+    """Apply calculate_population to a DataFrame with the /api/nutrition field names and defaults."""
+    def column(name, default):
+        return df[name].fillna(default).to_numpy() if name in df.columns else np.full(len(df), default)
+
+    results = calculate_population(column('age', 30).astype(np.int64), column('height', 170).astype(np.int64),
+                                   column('weight', 70).astype(float), column('gender', 'Male'),
+                                   column('activityLevel', 'Little/no exercise'), column('weightGoal', 'Maintain'))
+    return pd.DataFrame(results, index=df.index)
+
+
+def _read_chunks(path, chunksize):
+    if path.endswith('.parquet'):
+        # Parquet needs pyarrow; read it by row group to keep memory bounded
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute BMI, calories and macros for many users at once")
+    parser.add_argument('input', help='CSV or Parquet file of user profiles')
+    parser.add_argument('-o', '--output', required=True, help='CSV or Parquet output file')
+    parser.add_argument('--chunksize', type=int, default=500000, help='rows processed per chunk')
+    args = parser.parse_args(argv)
+
+    if os.path.exists(args.output):
+        os.remove(args.output)
+    writer = None
+    rows = 0
+    for chunk in _read_chunks(args.input, args.chunksize):
+        results = pd.concat([chunk, calculate_frame(chunk)], axis=1)
+        if args.output.endswith('.parquet'):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(results, preserve_index=False)
+            writer = writer or pq.ParquetWriter(args.output, table.schema)
+            writer.write_table(table)
+        else:
+            results.to_csv(args.output, mode='a', header=rows == 0, index=False)
+        rows += len(chunk)
+    if writer is not None:
+        writer.close()
+    print(f"Wrote {rows} rows to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+import json
+import logging
+import os
+import numpy as np
+import pandas as pd
+from .ingredients import IngredientIndex
+from .recipe_columns import RecipeColumns
+
+logger = logging.getLogger(__name__)
+
+# Bump when the on-disk layout changes so stale caches are rebuilt
+CACHE_VERSION = 4
+
+MANIFEST_FILE = 'manifest.json'
+NUTRIENTS_FILE = 'nutrients.npy'
+INGREDIENTS_PREFIX = 'ingredients'
+INGREDIENTS_SUFFIXES = ['_offsets.npy', '_ids.npy', '_vocabulary.json']
+METADATA_PREFIX = 'metadata'
+
+
+def cache_dir_for(csv_path):
+    # Keep the cache next to the CSV it was built from
+    return os.environ.get('RECIPES_CACHE_DIR') or os.path.join(os.path.dirname(os.path.abspath(csv_path)), '.recipes_cache')
+
+
+def _csv_key(csv_path):
+    stat = os.stat(csv_path)
+    return {'csv_size': stat.st_size, 'csv_mtime_ns': stat.st_mtime_ns}
+
+
+def _read_manifest(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def parse_recipes_csv(csv_path, nutrition_features, metadata_columns, ingredient_column):
+    """Parse recipes.csv once into (RecipeColumns, float64 nutrient matrix, IngredientIndex) of complete rows."""
+    wanted = set(nutrition_features) | set(metadata_columns) | {ingredient_column}
+    df = pd.read_csv(csv_path, usecols=lambda column: column in wanted)
+
+    # Check if the dataset has all required features
+    missing_features = [feature for feature in nutrition_features if feature not in df.columns]
+    if missing_features:
+        logger.warning("Dataset is missing the following features: %s", missing_features)
+    for column in nutrition_features:
+        if column not in df.columns:
+            df[column] = 0  # Add missing columns with zeros
+    nutrients = df[nutrition_features].to_numpy(dtype=np.float64)
+
+    # Keep only recipes with complete nutrition data
+    complete = ~np.isnan(nutrients).any(axis=1)
+    logger.info("Parsed %d recipes, %d with complete nutrition data", len(df), int(complete.sum()))
+    metadata = RecipeColumns.from_frame(df.loc[complete], metadata_columns)
+    raw_ingredients = df.loc[complete, ingredient_column] if ingredient_column in df.columns else [None] * len(metadata)
+    ingredients = IngredientIndex.from_values(raw_ingredients)
+    return metadata, np.ascontiguousarray(nutrients[complete]), ingredients
+
+
+def _write_cache(cache_dir, key, metadata, nutrients, ingredients):
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # Write to temporary names and rename, so readers never see a partial cache; the names
+    # are per process because several workers may rebuild after the CSV changes
+    tmp = f'.{os.getpid()}.tmp'
+    nutrients_tmp = os.path.join(cache_dir, NUTRIENTS_FILE + tmp)
+    with open(nutrients_tmp, 'wb') as f:
+        np.save(f, nutrients)
+    metadata.save(os.path.join(cache_dir, METADATA_PREFIX + tmp))
+    ingredients.save(os.path.join(cache_dir, INGREDIENTS_PREFIX + tmp))
+    manifest_tmp = os.path.join(cache_dir, MANIFEST_FILE + tmp)
+    with open(manifest_tmp, 'w') as f:
+        json.dump(dict(key, version=CACHE_VERSION, rows=len(metadata)), f)
+
+    os.replace(nutrients_tmp, os.path.join(cache_dir, NUTRIENTS_FILE))
+    for prefix, suffixes in ((METADATA_PREFIX, metadata.suffixes()), (INGREDIENTS_PREFIX, INGREDIENTS_SUFFIXES)):
+        for suffix in suffixes:
+            os.replace(os.path.join(cache_dir, prefix + tmp + suffix), os.path.join(cache_dir, prefix + suffix))
+    # The manifest goes last: it is what marks the cache as valid
+    os.replace(manifest_tmp, os.path.join(cache_dir, MANIFEST_FILE))
+
+
+def _read_cache(cache_dir, manifest):
+    # Memory-map every array so workers share the same page-cache pages
+    nutrients = np.load(os.path.join(cache_dir, NUTRIENTS_FILE), mmap_mode='r')
+    metadata = RecipeColumns.load(os.path.join(cache_dir, METADATA_PREFIX))
+    ingredients = IngredientIndex.load(os.path.join(cache_dir, INGREDIENTS_PREFIX))
+    if len(metadata) != manifest['rows'] or nutrients.shape[0] != manifest['rows'] or len(ingredients) != manifest['rows']:
+        raise ValueError("Recipe cache is inconsistent with its manifest")
+    return metadata, nutrients, ingredients
+
+
+def load_recipe_arrays(csv_path, nutrition_features, metadata_columns, ingredient_column):
+    """Return (metadata, nutrients, ingredients) for csv_path, using the columnar cache when it is up to date.
+
+    The cache is keyed on the CSV's size and mtime and rebuilt on the first load after
+    the CSV changes. If the cache directory is not writable the parsed arrays are
+    returned from memory instead.
+    """
+    key = _csv_key(csv_path)
+    cache_dir = cache_dir_for(csv_path)
+
+    manifest = _read_manifest(cache_dir)
+    if (manifest and manifest.get('version') == CACHE_VERSION
+            and all(manifest.get(k) == v for k, v in key.items())):
+        try:
+            metadata, nutrients, ingredients = _read_cache(cache_dir, manifest)
+            if metadata.names == list(metadata_columns) and nutrients.shape[1] == len(nutrition_features):
+                logger.info("Loaded %d recipes from cache at %s", len(metadata), cache_dir)
+                return metadata, nutrients, ingredients
+        except Exception as e:
+            logger.warning("Ignoring unreadable recipe cache at %s: %s", cache_dir, e)
+
+    logger.info("Building recipe cache from %s", csv_path)
+    metadata, nutrients, ingredients = parse_recipes_csv(csv_path, nutrition_features, metadata_columns, ingredient_column)
+    try:
+        _write_cache(cache_dir, key, metadata, nutrients, ingredients)
+        return _read_cache(cache_dir, _read_manifest(cache_dir))
+    except Exception as e:
+        logger.warning("Could not write recipe cache to %s: %s", cache_dir, e)
+        return metadata, nutrients, ingredients
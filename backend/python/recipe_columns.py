@@ -0,0 +1,133 @@
+import json
+import numpy as np
+import pandas as pd
+
+
+class StringColumn:
+    """Strings packed into one UTF-8 buffer, one entry per recipe.
+
+    Row ``i`` is ``data[offsets[i]:offsets[i + 1]]`` decoded, or None where ``missing[i]``.
+    The three arrays can be memory-mapped, so no Python string exists until a row is read.
+    """
+
+    suffixes = ['_offsets.npy', '_data.npy', '_missing.npy']
+
+    def __init__(self, offsets, data, missing):
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.data = np.asarray(data, dtype=np.uint8)
+        self.missing = np.asarray(missing, dtype=bool)
+
+    @classmethod
+    def from_values(cls, values):
+        encoded = []
+        missing = []
+        for value in values:
+            is_missing = not isinstance(value, str) and pd.isna(value)
+            missing.append(is_missing)
+            encoded.append(b'' if is_missing else str(value).encode('utf-8'))
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        return cls(offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8), missing)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        if self.missing[row]:
+            return None
+        return self.data[self.offsets[row]:self.offsets[row + 1]].tobytes().decode('utf-8')
+
+    def take(self, rows):
+        """Return the values of the given rows as a list."""
+        return [self[row] for row in rows]
+
+    def select(self, rows):
+        """Return a new column holding only the given rows, in that order."""
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = self.offsets[rows]
+        lengths = self.offsets[rows + 1] - starts
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        positions = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1], dtype=np.int64)
+        return StringColumn(offsets, self.data[positions], self.missing[rows])
+
+    @classmethod
+    def concat(cls, columns):
+        offsets = [np.zeros(1, dtype=np.int64)]
+        total = 0
+        for column in columns:
+            offsets.append(column.offsets[1:] - column.offsets[0] + total)
+            total += int(column.offsets[-1] - column.offsets[0])
+        return cls(np.concatenate(offsets), np.concatenate([column.data[column.offsets[0]:column.offsets[-1]] for column in columns]),
+                   np.concatenate([column.missing for column in columns]))
+
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + self.data.nbytes + self.missing.nbytes
+
+    def save(self, prefix):
+        for suffix, array in zip(self.suffixes, (self.offsets, self.data, self.missing)):
+            np.save(prefix + suffix, array)
+
+    @classmethod
+    def load(cls, prefix, mmap_mode='r'):
+        return cls(*(np.load(prefix + suffix, mmap_mode=mmap_mode) for suffix in cls.suffixes))
+
+
+class RecipeColumns:
+    """Struct-of-arrays recipe metadata: one ``StringColumn`` per column name."""
+
+    def __init__(self, columns):
+        self.columns = dict(columns)
+        lengths = {len(column) for column in self.columns.values()}
+        if len(lengths) > 1:
+            raise ValueError("Recipe columns have different lengths")
+        self._length = lengths.pop() if lengths else 0
+
+    @classmethod
+    def from_frame(cls, df, names):
+        """Pack the named DataFrame columns; absent columns are all missing."""
+        return cls({name: StringColumn.from_values(df[name] if name in df.columns else [None] * len(df)) for name in names})
+
+    @classmethod
+    def empty(cls, names):
+        return cls({name: StringColumn.from_values([]) for name in names})
+
+    def __len__(self):
+        return self._length
+
+    def select(self, rows):
+        """Return new columns holding only the given rows, in that order."""
+        return RecipeColumns({name: column.select(rows) for name, column in self.columns.items()})
+
+    def appended(self, other):
+        """Return new columns with the rows of ``other`` (same column names) added at the end."""
+        return RecipeColumns({name: StringColumn.concat([column, other[name]]) for name, column in self.columns.items()})
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @property
+    def names(self):
+        return list(self.columns)
+
+    @property
+    def nbytes(self):
+        return sum(column.nbytes for column in self.columns.values())
+
+    def suffixes(self):
+        """File name suffixes written by ``save``, for callers that move the files afterwards."""
+        return ['_columns.json'] + [f'_{i}{suffix}' for i in range(len(self.columns)) for suffix in StringColumn.suffixes]
+
+    def save(self, prefix):
+        # Columns are stored by position, so any column name is a valid file name
+        for i, column in enumerate(self.columns.values()):
+            column.save(f'{prefix}_{i}')
+        with open(prefix + '_columns.json', 'w') as f:
+            json.dump(self.names, f)
+
+    @classmethod
+    def load(cls, prefix, mmap_mode='r'):
+        with open(prefix + '_columns.json') as f:
+            names = json.load(f)
+        return cls({name: StringColumn.load(f'{prefix}_{i}', mmap_mode) for i, name in enumerate(names)})
@@ -0,0 +1,267 @@
+import json
+import logging
+import os
+import threading
+import time
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+from .ingredients import IngredientIndex, InvertedIngredientIndex
+from .metrics import registry, stage
+from .recipe_cache import load_recipe_arrays
+from .recipe_columns import RecipeColumns
+from .search_backends import make_backend
+
+logger = logging.getLogger(__name__)
+
+# Nutrition values used for food recommendations
+nutrition_features = ['Calories', 'FatContent', 'SaturatedFatContent', 'CholesterolContent', 'SodiumContent',
+                      'CarbohydrateContent', 'FiberContent', 'SugarContent', 'ProteinContent']
+
+# Columns returned to the frontend for every recommended recipe
+result_columns = ['Name', 'Calories', 'RecipeIngredientParts', 'CookTime', 'PrepTime', 'TotalTime']
+
+# Raw ingredient column, parsed once into an IngredientIndex at load time
+ingredient_column = 'RecipeIngredientParts'
+
+# Stable recipe identifier, used to update or remove recipes in a live catalog
+id_column = 'RecipeId'
+
+# The id and the result columns that are neither nutrient values nor ingredients, stored alongside the nutrient matrix
+metadata_columns = [id_column] + [column for column in result_columns if column not in nutrition_features and column != ingredient_column]
+
+# Get the backend directory (one level up from this file)
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Candidate locations for recipes.csv, in the order they are tried
+possible_paths = [
+    os.path.join(backend_dir, "datasets", "recipes.csv"),
+    os.path.join(backend_dir, "..", "datasets", "recipes.csv"),
+    os.path.join(backend_dir, "..", "..", "datasets", "recipes.csv")
+]
+
+
+def backend_from_env():
+    """Create the search backend named by SEARCH_BACKEND, tuned by SEARCH_BACKEND_OPTIONS (JSON)."""
+    name = os.environ.get('SEARCH_BACKEND', 'exact')
+    options = json.loads(os.environ.get('SEARCH_BACKEND_OPTIONS') or '{}')
+    return make_backend(name, **options)
+
+
+def find_recipes_csv():
+    """Return the first existing recipes.csv location, or None."""
+    for path in possible_paths:
+        logger.debug("Attempting to load recipes from: %s", path)
+        if os.path.isfile(path):
+            return path
+        logger.debug("File not found at %s", path)
+    return None
+
+
+# Why the last load_recipes call fell back to an empty dataset, or None
+_load_error = None
+
+
+def load_recipes():
+    """Load (metadata, nutrients, ingredients) for recipes with complete nutrition data, or empty arrays.
+
+    On failure the error is logged and kept for ``load_error``.
+    """
+    global _load_error
+    start = time.perf_counter()
+    try:
+        path = find_recipes_csv()
+        if path is None:
+            raise FileNotFoundError("Could not find recipes.csv in any of the expected locations")
+
+        metadata, nutrients, ingredients = load_recipe_arrays(path, nutrition_features, metadata_columns, ingredient_column)
+        logger.info("Successfully loaded %d recipes from %s", len(metadata), path)
+        registry.set_gauge('inertiafit_dataset_load_seconds', time.perf_counter() - start, 'Time spent loading the recipe dataset')
+        _load_error = None
+        return metadata, nutrients, ingredients
+
+    except Exception as e:
+        logger.error("Error loading dataset: %s", e)
+        _load_error = str(e)
+        # Create empty arrays with the required columns
+        logger.warning("Creating empty dataset as fallback")
+        return RecipeColumns.empty(metadata_columns), np.empty((0, len(nutrition_features))), IngredientIndex.empty()
+
+
+class Recommender:
+    """Recipe recommendations built on ``search``, ``records`` and ``explain``, which subclasses provide."""
+
+    def recommend(self, target_nutrition, top_n, candidates=None, explain=False):
+        """Return the top_n recipes closest to a single 9-value nutrition profile."""
+        return self.recommend_batch(np.asarray(target_nutrition, dtype=float).reshape(1, -1), top_n, candidates, explain)[0]
+
+    def recommend_batch(self, targets, top_n, candidates=None, explain=False):
+        """Return one list of top_n recipes per row of an (n, 9) matrix of nutrition profiles.
+
+        ``candidates`` is an optional boolean mask (see ``candidate_mask``) restricting
+        the search to recipes that pass the ingredient filters. With ``explain`` each
+        recipe also carries its distance and nutrient deltas (see ``explain``).
+        """
+        targets = np.asarray(targets, dtype=float).reshape(-1, len(nutrition_features))
+        distances, indices = self.search(targets, top_n, candidates)
+        if indices.shape[1] == 0:
+            return [[] for _ in range(len(indices))]
+
+        # Build response objects for the selected rows only, then split per target
+        records = self.records(indices.ravel())
+        n_neighbors = indices.shape[1]
+        if explain:
+            self.explain(records, np.repeat(targets, n_neighbors, axis=0), indices.ravel(), distances.ravel())
+        return [records[i:i + n_neighbors] for i in range(0, len(records), n_neighbors)]
+
+
+class RecommendationEngine(Recommender):
+    """Scaled nutrition matrix and cosine neighbor index, fitted once per dataset.
+
+    ``metadata`` holds the remaining result columns as ``RecipeColumns``, ``nutrients``
+    the matching (n, 9) matrix of complete nutrition rows and ``ingredients`` the
+    pre-parsed ingredient lists, as produced by ``load_recipes``. ``backend`` is an
+    unfitted search backend from ``search_backends`` and defaults to the one configured
+    by the environment. Given a ``previous`` engine instead, its backend is refitted to
+    the new rows, reusing trained state where the backend supports it. A fitted
+    ``scaler`` is reused as is instead of being fitted to these rows.
+    """
+
+    def __init__(self, metadata, nutrients, ingredients, backend=None, previous=None, scaler=None):
+        self.metadata = metadata
+        self.nutrients = nutrients
+        self.ingredients = ingredients
+        logger.info("Filtered dataset size: %d recipes", len(self.metadata))
+
+        # Token -> recipe posting lists for ingredient filters
+        self.ingredient_index = InvertedIngredientIndex(ingredients)
+
+        self.scaler = None
+        self.backend = None
+        if len(self.metadata) == 0:
+            logger.warning("No recipes with complete nutrition data, recommendations disabled")
+            return
+
+        # Normalize the data and train the KNN model; float32 halves the resident feature matrix
+        if scaler is None:
+            self.scaler = StandardScaler()
+            self.X_scaled = self.scaler.fit_transform(np.asarray(nutrients, dtype=float)).astype(np.float32)
+        else:
+            self.scaler = scaler
+            self.X_scaled = scaler.transform(np.asarray(nutrients, dtype=float)).astype(np.float32)
+
+        start = time.perf_counter()
+        if backend is None and previous is not None and previous.backend is not None:
+            logger.info("Updating '%s' search index", previous.backend.name)
+            self.backend = previous.backend.refit(self.X_scaled)
+        else:
+            self.backend = backend if backend is not None else backend_from_env()
+            logger.info("Building '%s' search index", self.backend.name)
+            self.backend.fit(self.X_scaled)
+        registry.set_gauge('inertiafit_index_build_seconds', time.perf_counter() - start,
+                           'Time spent building the search index', backend=self.backend.name)
+        registry.set_gauge('inertiafit_catalog_recipes', len(self.metadata), 'Recipes in the search index')
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """Build an engine from a recipes DataFrame, dropping incomplete nutrition rows."""
+        df_filtered = df.dropna(subset=nutrition_features).reset_index(drop=True)
+        metadata = RecipeColumns.from_frame(df_filtered, metadata_columns)
+        raw_ingredients = df_filtered[ingredient_column] if ingredient_column in df_filtered.columns else [None] * len(df_filtered)
+        return cls(metadata, df_filtered[nutrition_features].to_numpy(dtype=float), IngredientIndex.from_values(raw_ingredients))
+
+    def __len__(self):
+        return len(self.metadata)
+
+    def candidate_mask(self, required=(), excluded=()):
+        """Boolean mask of recipes matching the ingredient filters, or None when there are none."""
+        return self.ingredient_index.candidate_mask(required, excluded)
+
+    def search(self, targets, k, candidates=None):
+        """Return (distances, row indices) of the k nearest recipes for each row of an (n, 9) target matrix.
+
+        Fewer than k columns are returned when fewer recipes are available, and none when
+        the catalog is empty.
+        """
+        targets = np.asarray(targets, dtype=float).reshape(-1, len(nutrition_features))
+        k = int(k)
+        rows = None if candidates is None else np.flatnonzero(candidates)
+        n_available = len(self.metadata) if rows is None else len(rows)
+        if self.backend is None or k <= 0 or len(targets) == 0 or n_available == 0:
+            return np.empty((len(targets), 0)), np.empty((len(targets), 0), dtype=np.int64)
+
+        # Scale all target nutrition values and find their neighbors in one query
+        with stage('search'):
+            targets_scaled = self.scaler.transform(targets)
+            return self.backend.query(targets_scaled, min(k, n_available), rows)
+
+    def records(self, rows):
+        """Return the response objects (result_columns) of the given row ids, in order."""
+        with stage('materialize'):
+            values = []
+            for column in result_columns:
+                if column == ingredient_column:
+                    values.append([self.ingredients.joined(row) for row in rows])
+                elif column in nutrition_features:
+                    values.append(self.nutrients[rows, nutrition_features.index(column)].tolist())
+                else:
+                    values.append(self.metadata[column].take(rows))
+            return [dict(zip(result_columns, row)) for row in zip(*values)]
+
+    def nutrient_values(self, rows):
+        """Return the (len(rows), 9) nutrition values of the given row ids."""
+        return np.asarray(self.nutrients[np.asarray(rows, dtype=np.int64)], dtype=float).reshape(-1, len(nutrition_features))
+
+    def explain(self, records, targets, rows, distances):
+        """Add the search's cosine ``distance`` and ``nutrient_deltas`` to each record, in place.
+
+        ``targets`` holds the target each record was found for, one row per record. Deltas
+        are recipe minus target in nutrient units, taken from the scaled matrix the search
+        ran on, so no nutrient values are read back.
+        """
+        if len(rows) == 0:
+            return records
+        with stage('explain'):
+            targets_scaled = self.scaler.transform(np.asarray(targets, dtype=float))
+            deltas = np.round((self.X_scaled[rows] - targets_scaled) * self.scaler.scale_, 3)
+            for record, distance, row_deltas in zip(records, np.asarray(distances, dtype=float).tolist(), deltas.tolist()):
+                record['distance'] = round(distance, 6)
+                record['nutrient_deltas'] = dict(zip(nutrition_features, row_deltas))
+        return records
+
+
+_engine = None
+_engine_generation = 0
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """Return the process-wide engine, loading the dataset and fitting the index on first use."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = RecommendationEngine(*load_recipes())
+    return _engine
+
+
+def engine_ready():
+    """True once the process-wide engine has been built."""
+    return _engine is not None
+
+
+def load_error():
+    """Why the dataset failed to load, or None if the last load succeeded."""
+    return _load_error
+
+
+def engine_generation():
+    """Count of engines installed with ``set_engine``, for cache keys that must not outlive an engine."""
+    return _engine_generation
+
+
+def set_engine(engine):
+    """Install an already built engine as the process-wide one (used by benchmarks and reloads)."""
+    global _engine, _engine_generation
+    with _engine_lock:
+        _engine = engine
+        _engine_generation += 1
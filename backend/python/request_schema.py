@@ -0,0 +1,250 @@
+"""Request schemas for the JSON endpoints.
+
+Each ``Schema`` is built once at import into a list of per-field converters. ``validate``
+checks a payload with them before any dataset work starts, and returns the values
+normalized (types coerced, defaults filled, enumerations and ingredient filters in
+canonical form). Bad payloads raise ``ValidationError``, which the API answers with a 400
+naming the field. Because equivalent payloads normalize to equal values, ``Schema.key``
+is the canonical response cache key.
+"""
+import base64
+import binascii
+import json
+import math
+from .ingredients import parse_ingredient_query
+from .population import activity_levels
+from .recommendation_engine import nutrition_features
+
+MISSING = object()
+
+
+class ValidationError(ValueError):
+    """A request payload that does not match its schema; ``field`` names the offending value."""
+
+    def __init__(self, message, field=None):
+        super().__init__(message)
+        self.message = message
+        self.field = field
+
+
+def _number(value, field):
+    # JSON numbers, and numeric strings as sent by HTML form inputs; never booleans
+    if isinstance(value, str):
+        try:
+            value = float(value.strip())
+        except ValueError:
+            raise ValidationError(f'"{field}" must be a number', field)
+    elif isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValidationError(f'"{field}" must be a number', field)
+    if not math.isfinite(value):
+        raise ValidationError(f'"{field}" must be a finite number', field)
+    return value
+
+
+def _bounded(convert, minimum, maximum):
+    def check(value, field):
+        value = convert(_number(value, field))
+        if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+            if maximum is None:
+                raise ValidationError(f'"{field}" must be at least {minimum}', field)
+            if minimum is None:
+                raise ValidationError(f'"{field}" must be at most {maximum}', field)
+            raise ValidationError(f'"{field}" must be between {minimum} and {maximum}', field)
+        return value
+    return check
+
+
+def integer(minimum=None, maximum=None):
+    # Fractional values are truncated, as int() always did here
+    return _bounded(int, minimum, maximum)
+
+
+def number(minimum=None, maximum=None):
+    return _bounded(float, minimum, maximum)
+
+
+def text(max_length=100):
+    def check(value, field):
+        if not isinstance(value, str):
+            raise ValidationError(f'"{field}" must be a string', field)
+        if len(value) > max_length:
+            raise ValidationError(f'"{field}" must be at most {max_length} characters', field)
+        return value.strip()
+    return check
+
+
+def boolean():
+    def check(value, field):
+        if not isinstance(value, bool):
+            raise ValidationError(f'"{field}" must be true or false', field)
+        return value
+    return check
+
+
+def choice(choices, match=lambda option, value: option.lower() == value.lower(), fallback=None):
+    """A string normalized to the first of ``choices`` it matches, else ``fallback`` (or an error)."""
+    as_text = text()
+
+    def check(value, field):
+        value = as_text(value, field)
+        for option in choices:
+            if match(option, value):
+                return option
+        if fallback is not None:
+            return fallback
+        raise ValidationError(f'"{field}" must be one of {", ".join(choices)}', field)
+    return check
+
+
+def number_list(length):
+    def check(value, field):
+        if not isinstance(value, list) or len(value) != length:
+            raise ValidationError(f'"{field}" must be a list of {length} numbers', field)
+        return tuple(number(minimum=0)(item, f'{field}[{i}]') for i, item in enumerate(value))
+    return check
+
+
+def ingredient_filter(max_phrases=50):
+    # Filters match case-insensitively and in any order, so their canonical form is the
+    # sorted, lowercased, de-duplicated phrases
+    def check(value, field):
+        if not isinstance(value, (str, list)) or (isinstance(value, list) and not all(isinstance(item, str) for item in value)):
+            raise ValidationError(f'"{field}" must be a string or a list of strings', field)
+        phrases = tuple(sorted({phrase.lower() for phrase in parse_ingredient_query(value)}))
+        if len(phrases) > max_phrases:
+            raise ValidationError(f'"{field}" may list at most {max_phrases} ingredients', field)
+        return phrases
+    return check
+
+
+def list_of(schema, max_items):
+    def check(value, field):
+        if not isinstance(value, list):
+            raise ValidationError(f'Expected a "{field}" list of objects', field)
+        if len(value) > max_items:
+            raise ValidationError(f'At most {max_items} items are accepted in "{field}"', field)
+        return [schema.validate(item, prefix=f'{field}[{i}].') for i, item in enumerate(value)]
+    return check
+
+
+def cursor(schema):
+    """An opaque cursor from ``encode_cursor``, decoded into values validated by ``schema``."""
+    def check(value, field):
+        if not isinstance(value, str):
+            raise ValidationError(f'"{field}" must be a string', field)
+        try:
+            state = json.loads(base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)))
+        except (binascii.Error, ValueError):
+            raise ValidationError(f'"{field}" is not a valid cursor', field)
+        try:
+            return schema.validate(state)
+        except ValidationError:
+            raise ValidationError(f'"{field}" is not a valid cursor', field)
+    return check
+
+
+def encode_cursor(schema, values, **changes):
+    """Encode validated values (with ``changes`` applied) as a cursor for ``cursor(schema)``.
+
+    The cursor holds the whole canonical request, so any server process can continue it.
+    """
+    state = {name: values[name] for name, _, _ in schema.fields}
+    state.update(changes)
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+class Schema:
+    """Named fields, each ``(name, converter, default)``; a default of MISSING makes it required.
+
+    A callable default is called with the values converted so far, for defaults that depend
+    on another field.
+    """
+
+    def __init__(self, *fields):
+        self.fields = fields
+
+    def validate(self, data, prefix=''):
+        if not isinstance(data, dict):
+            raise ValidationError('Expected a JSON object' if not prefix else f'"{prefix[:-1]}" must be an object',
+                                  prefix[:-1] or None)
+        values = {}
+        for name, convert, default in self.fields:
+            value = data.get(name)
+            if value is None:
+                if default is MISSING:
+                    raise ValidationError(f'"{prefix}{name}" is required', prefix + name)
+                values[name] = default(values) if callable(default) else default
+            else:
+                values[name] = convert(value, prefix + name)
+        return values
+
+    def key(self, values):
+        """Canonical cache key of validated values: equal for equivalent requests."""
+        return tuple(values[name] for name, _, _ in self.fields)
+
+
+def _activity_match(option, value):
+    # Same substring rule as Person.activity_index, so labels such as
+    # "Moderate exercise (3-5 days/week)" keep working
+    return option.lower() in value.lower()
+
+
+profile_fields = (
+    ('age', integer(1, 120), 30),
+    ('height', integer(50, 272), 170),
+    ('weight', number(2, 650), 70.0),
+    # Any value other than Male uses the female BMR formula
+    ('gender', text(), 'Male'),
+    ('activityLevel', choice(activity_levels, _activity_match, fallback=activity_levels[0]), activity_levels[0]),
+    ('weightGoal', choice(['Lose', 'Maintain', 'Gain'], fallback='Maintain'), 'Maintain'),
+    ('seed', integer(0, 2 ** 63 - 1), None),
+)
+
+# Upper bounds on the work a single request may ask for
+MAX_RECOMMENDATIONS = 100
+MAX_BATCH_PROFILES = 5000
+MAX_PLAN_DAYS = 28
+MAX_CURSOR_RESULTS = 1000
+
+profile_schema = Schema(*profile_fields)
+
+nutrition_schema = Schema(
+    *profile_fields,
+    ('explain', boolean(), False),
+)
+
+batch_schema = Schema(
+    ('profiles', list_of(profile_schema, MAX_BATCH_PROFILES), MISSING),
+    ('nb_recommendations', integer(1, MAX_RECOMMENDATIONS), 3),
+)
+
+meal_plan_schema = Schema(
+    *profile_fields,
+    ('days', integer(1, MAX_PLAN_DAYS), 7),
+    ('repeat_window', integer(1), lambda values: values['days']),
+    ('tolerance', number(0.001, 10), 0.1),
+)
+
+custom_fields = (
+    ('nutrition_values_list', number_list(len(nutrition_features)), MISSING),
+    ('nb_recommendations', integer(1, MAX_RECOMMENDATIONS), 6),
+    ('ingredient_txt', ingredient_filter(), ()),
+    ('excluded_ingredients', ingredient_filter(), ()),
+    ('explain', boolean(), False),
+)
+
+# State carried from one page of custom recommendations to the next
+custom_cursor_schema = Schema(
+    *custom_fields,
+    ('offset', integer(0, MAX_CURSOR_RESULTS), 0),
+)
+
+custom_schema = Schema(
+    *custom_fields,
+    ('paginate', boolean(), False),
+)
+
+# The next page of custom recommendations: the cursor replaces every other field
+custom_next_page_schema = Schema(
+    ('cursor', cursor(custom_cursor_schema), MISSING),
+)
@@ -0,0 +1,401 @@
+import copy
+import json
+import multiprocessing
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.neighbors import NearestNeighbors
+
+
+def _normalize_rows(X):
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return X / norms
+
+
+def _top_k(distances, k):
+    # Partial sort: O(n) selection, then order only the k winners
+    top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    top = np.take_along_axis(top, np.take_along_axis(distances, top, axis=1).argsort(axis=1), axis=1)
+    return np.take_along_axis(distances, top, axis=1), top
+
+
+class SearchBackend:
+    """Cosine nearest-neighbor search over the scaled nutrition matrix.
+
+    ``query`` returns ``(distances, indices)`` arrays of shape (n_targets, k), sorted by
+    distance. ``rows`` optionally restricts the search to a sorted array of row ids.
+    """
+
+    name = None
+
+    def fit(self, X_scaled):
+        raise NotImplementedError
+
+    def query(self, targets_scaled, k, rows=None):
+        raise NotImplementedError
+
+    def refit(self, X_scaled):
+        """Return a backend with the same options fitted to a changed catalog, leaving this one usable.
+
+        Backends that can reuse trained state (such as IVF centroids) override this to
+        avoid a full fit.
+        """
+        return copy.copy(self).fit(X_scaled)
+
+
+class MatmulBackend(SearchBackend):
+    """Exact cosine search as one matrix product against pre-normalized rows.
+
+    ``dtype`` trades precision for memory bandwidth (float64 doubles it) and
+    ``chunk_size`` bounds the (targets x rows) distance block held in memory.
+    """
+
+    name = 'numpy'
+
+    def __init__(self, dtype='float32', chunk_size=256):
+        self.dtype = np.dtype(dtype)
+        self.chunk_size = int(chunk_size)
+
+    def fit(self, X_scaled):
+        self.X_normalized = _normalize_rows(np.asarray(X_scaled, dtype=float)).astype(self.dtype)
+        return self
+
+    def query(self, targets_scaled, k, rows=None):
+        return self._query_rows(self.X_normalized if rows is None else self.X_normalized[rows], targets_scaled, k, rows)
+
+    def _query_rows(self, X, targets_scaled, k, rows):
+        # X holds the normalized rows searched: all of them, or those listed in rows
+        targets = _normalize_rows(np.asarray(targets_scaled, dtype=float)).astype(self.dtype)
+        distances = np.empty((len(targets), k))
+        indices = np.empty((len(targets), k), dtype=np.int64)
+        for start in range(0, len(targets), self.chunk_size):
+            stop = start + self.chunk_size
+            block = 1.0 - targets[start:stop] @ X.T
+            distances[start:stop], indices[start:stop] = _top_k(block, k)
+        if rows is not None:
+            indices = rows[indices]
+        return distances, indices
+
+
+class ExactBackend(MatmulBackend):
+    """Brute-force cosine ``NearestNeighbors``, the reference result for recall reports.
+
+    It keeps no normalized copy of the matrix: filtered queries normalize just the rows
+    they search.
+    """
+
+    name = 'exact'
+
+    def __init__(self):
+        super().__init__()
+
+    def fit(self, X_scaled):
+        # NearestNeighbors keeps a reference to a float matrix rather than a copy, so the
+        # engine's scaled matrix is the only one resident
+        self.knn = NearestNeighbors(metric='cosine', algorithm='brute')
+        self.knn.fit(X_scaled)
+        self.X_scaled = X_scaled
+        self.fit_dtype = np.asarray(X_scaled).dtype
+        return self
+
+    def query(self, targets_scaled, k, rows=None):
+        if rows is not None:
+            # NearestNeighbors cannot be restricted to a subset, so filter by matrix product
+            X = _normalize_rows(np.asarray(self.X_scaled[rows], dtype=float)).astype(self.dtype)
+            return self._query_rows(X, targets_scaled, k, rows)
+        # Match the fitted dtype, or scikit-learn upcasts a copy of the whole matrix per query
+        return self.knn.kneighbors(np.asarray(targets_scaled, dtype=self.fit_dtype), n_neighbors=k)
+
+
+class IVFBackend(MatmulBackend):
+    """Approximate search with an inverted file over k-means clusters of normalized rows.
+
+    Each query scans only the ``n_probe`` lists whose centroids are closest, out of
+    ``n_lists``. Raising ``n_probe`` raises recall and latency; ``n_probe == n_lists``
+    is exact.
+    """
+
+    name = 'ivf'
+
+    def __init__(self, n_lists=None, n_probe=8, dtype='float32', random_state=0):
+        super().__init__(dtype=dtype)
+        self.n_lists = n_lists
+        self.n_probe = int(n_probe)
+        self.random_state = random_state
+
+    def fit(self, X_scaled):
+        super().fit(X_scaled)
+        n_rows = len(self.X_normalized)
+        # Default to about sqrt(n) lists, the usual IVF starting point
+        n_lists = int(self.n_lists or max(1, int(np.sqrt(n_rows))))
+        self.n_lists_ = n_lists = max(1, min(n_lists, n_rows))
+
+        kmeans = MiniBatchKMeans(n_clusters=n_lists, random_state=self.random_state, n_init=3,
+                                 batch_size=max(1024, 4 * n_lists))
+        labels = kmeans.fit_predict(self.X_normalized)
+        self.centroids = _normalize_rows(kmeans.cluster_centers_).astype(self.dtype)
+        self._build_lists(labels)
+        return self
+
+    def refit(self, X_scaled):
+        # Keep the trained centroids and only reassign rows to their nearest list; call
+        # fit() instead after large catalog changes
+        backend = copy.copy(self)
+        MatmulBackend.fit(backend, X_scaled)
+        labels = np.empty(len(backend.X_normalized), dtype=np.int64)
+        for start in range(0, len(labels), 65536):
+            labels[start:start + 65536] = (backend.X_normalized[start:start + 65536] @ backend.centroids.T).argmax(axis=1)
+        backend._build_lists(labels)
+        return backend
+
+    def _build_lists(self, labels):
+        # Rows grouped by list: list j owns list_rows[list_offsets[j]:list_offsets[j + 1]]
+        self.list_rows = np.argsort(labels, kind='stable')
+        self.list_offsets = np.searchsorted(labels[self.list_rows], np.arange(self.n_lists_ + 1))
+
+    def query(self, targets_scaled, k, rows=None):
+        targets = _normalize_rows(np.asarray(targets_scaled, dtype=float)).astype(self.dtype)
+        n_probe = min(self.n_probe, self.n_lists_)
+        _, probes = _top_k(1.0 - targets @ self.centroids.T, n_probe)
+
+        allowed = None
+        if rows is not None:
+            allowed = np.zeros(len(self.X_normalized), dtype=bool)
+            allowed[rows] = True
+
+        distances = np.empty((len(targets), k))
+        indices = np.empty((len(targets), k), dtype=np.int64)
+        for i, target in enumerate(targets):
+            probed = np.concatenate([self.list_rows[self.list_offsets[j]:self.list_offsets[j + 1]] for j in probes[i]])
+            if allowed is not None:
+                probed = probed[allowed[probed]]
+            if len(probed) < k:
+                # Too few rows in the probed lists: fall back to the exact answer for this target
+                probed = rows if rows is not None else np.arange(len(self.X_normalized))
+            block = 1.0 - (self.X_normalized[probed] @ target)[None, :]
+            row_distances, top = _top_k(block, k)
+            distances[i], indices[i] = row_distances[0], probed[top[0]]
+        return distances, indices
+
+
+# Shard executors are created on first use in each process, because neither threads nor
+# pipes to worker processes survive a fork
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def _shard_executor(kind, max_workers):
+    key = (kind, max_workers, os.getpid())
+    with _executors_lock:
+        if key not in _executors:
+            if kind == 'process':
+                # Spawned, not forked: forking a threaded server process is not safe
+                _executors[key] = ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context('spawn'))
+            else:
+                _executors[key] = ThreadPoolExecutor(max_workers, thread_name_prefix='shard')
+        return _executors[key]
+
+
+# Shared blocks attached by this worker process: name -> (SharedMemory, array)
+_attached = {}
+
+
+def _query_shared_shard(block, start, stop, dtype, chunk_size, targets_scaled, k, rows):
+    """Search rows start:stop of a shared-memory matrix; runs in a shard worker process."""
+    name, shape, block_dtype = block
+    if name not in _attached:
+        # A new block means the index was rebuilt, and the old blocks are no longer queried
+        for shm, _ in _attached.values():
+            shm.close()
+        _attached.clear()
+        shm = SharedMemory(name=name)
+        _attached[name] = shm, np.ndarray(shape, dtype=block_dtype, buffer=shm.buf)
+    shard = MatmulBackend(dtype, chunk_size)
+    shard.X_normalized = _attached[name][1][start:stop]
+    return shard.query(targets_scaled, k, rows)
+
+
+def _release_block(shm, owner):
+    try:
+        shm.close()
+    except BufferError:
+        pass  # arrays over the block are still alive at interpreter exit
+    # Forked children share the block but only its creator removes it
+    if os.getpid() == owner:
+        shm.unlink()
+
+
+class ShardedBackend(MatmulBackend):
+    """Exact cosine search split across shards that are queried in parallel.
+
+    Rows are partitioned into ``n_shards`` shards (default: one per CPU), each searched for
+    its own top k, and the per-shard results merged. ``by='calories'`` makes each shard a
+    band of the Calories feature (the first column) with equal row counts; ``by='rows'``
+    splits the rows in catalog order.
+
+    ``executor='thread'`` (the default) searches shards on a thread pool: the matrix
+    products release the GIL, so shards run on separate cores. ``executor='process'``
+    places the matrix in shared memory and searches it from a pool of worker processes,
+    so no part of the search holds one interpreter's GIL.
+
+    With calorie bands, ``prune`` (in standard deviations of Calories) skips shards
+    whose band lies further than that from a target's calories. That trades exactness for
+    work: the nearest recipes by cosine distance are usually, but not always, close in
+    calories. Targets whose remaining shards hold fewer than k rows search every shard.
+    """
+
+    name = 'sharded'
+
+    def __init__(self, n_shards=None, by='calories', executor='thread', workers=None, prune=None,
+                 dtype='float32', chunk_size=256):
+        super().__init__(dtype=dtype, chunk_size=chunk_size)
+        if by not in ('calories', 'rows'):
+            raise ValueError(f"Unknown sharding {by!r}; expected 'calories' or 'rows'")
+        if executor not in ('thread', 'process'):
+            raise ValueError(f"Unknown shard executor {executor!r}; expected 'thread' or 'process'")
+        if prune is not None and by != 'calories':
+            raise ValueError("Shard pruning requires calorie bands (by='calories')")
+        self.n_shards = n_shards
+        self.by = by
+        self.executor = executor
+        self.workers = workers
+        self.prune = None if prune is None else float(prune)
+
+    def fit(self, X_scaled):
+        X_scaled = np.asarray(X_scaled)
+        n_rows = len(X_scaled)
+        n_shards = max(1, min(int(self.n_shards or os.cpu_count() or 1), n_rows))
+        self.order = np.argsort(X_scaled[:, 0], kind='stable') if self.by == 'calories' else np.arange(n_rows)
+        self.positions = np.empty(n_rows, dtype=np.int64)
+        self.positions[self.order] = np.arange(n_rows)
+        self.shard_offsets = np.linspace(0, n_rows, n_shards + 1).astype(np.int64)
+        # Calorie range of each band, in scaled units, for pruning
+        calories = X_scaled[self.order, 0]
+        starts, stops = self.shard_offsets[:-1], np.maximum(self.shard_offsets[1:] - 1, self.shard_offsets[:-1])
+        self.band_low = calories[starts] if n_rows else np.zeros(n_shards)
+        self.band_high = calories[stops] if n_rows else np.zeros(n_shards)
+
+        X_normalized = _normalize_rows(np.asarray(X_scaled[self.order], dtype=float)).astype(self.dtype)
+        if self.executor == 'process':
+            shm = SharedMemory(create=True, size=max(X_normalized.nbytes, 1))
+            self._release = weakref.finalize(self, _release_block, shm, os.getpid())
+            self.X_normalized = np.ndarray(X_normalized.shape, dtype=X_normalized.dtype, buffer=shm.buf)
+            self.X_normalized[:] = X_normalized
+            self._block = (shm.name, X_normalized.shape, X_normalized.dtype.str)
+        else:
+            self.X_normalized = X_normalized
+        return self
+
+    def _shard_query(self, shard, targets_scaled, k, rows):
+        # Local row positions in, local positions out
+        start, stop = self.shard_offsets[shard], self.shard_offsets[shard + 1]
+        if self.executor == 'process':
+            return _shard_executor('process', self._max_workers()).submit(
+                _query_shared_shard, self._block, start, stop, self.dtype, self.chunk_size, targets_scaled, k, rows)
+        backend = MatmulBackend(self.dtype, self.chunk_size)
+        backend.X_normalized = self.X_normalized[start:stop]
+        return _shard_executor('thread', self._max_workers()).submit(backend.query, targets_scaled, k, rows)
+
+    def _max_workers(self):
+        return int(self.workers or min(len(self.shard_offsets) - 1, os.cpu_count() or 1))
+
+    def query(self, targets_scaled, k, rows=None):
+        targets_scaled = np.asarray(targets_scaled, dtype=float)
+        n_shards = len(self.shard_offsets) - 1
+
+        # Rows available in each shard, as local positions
+        if rows is None:
+            shard_rows = [None] * n_shards
+            available = np.diff(self.shard_offsets)
+        else:
+            positions = np.sort(self.positions[rows])
+            bounds = np.searchsorted(positions, self.shard_offsets)
+            shard_rows = [positions[bounds[s]:bounds[s + 1]] - self.shard_offsets[s] for s in range(n_shards)]
+            available = np.diff(bounds)
+
+        # Shards each target searches
+        probes = np.broadcast_to(available > 0, (len(targets_scaled), n_shards)).copy()
+        if self.prune is not None:
+            calories = targets_scaled[:, :1]
+            probes &= (self.band_high >= calories - self.prune) & (self.band_low <= calories + self.prune)
+            probes[probes @ available < k] = available > 0
+
+        # Search each shard for the targets that probe it, then merge the per-shard top k
+        distances = np.full((len(targets_scaled), n_shards * k), np.inf)
+        indices = np.zeros((len(targets_scaled), n_shards * k), dtype=np.int64)
+        futures = {}
+        for shard in range(n_shards):
+            targets = np.flatnonzero(probes[:, shard])
+            if len(targets):
+                futures[shard] = targets, self._shard_query(shard, targets_scaled[targets], min(k, available[shard]),
+                                                            shard_rows[shard])
+        for shard, (targets, future) in futures.items():
+            shard_distances, shard_indices = future.result()
+            columns = slice(shard * k, shard * k + shard_distances.shape[1])
+            distances[targets, columns] = shard_distances
+            indices[targets, columns] = self.order[shard_indices + self.shard_offsets[shard]]
+        distances, top = _top_k(distances, k)
+        return distances, np.take_along_axis(indices, top, axis=1)
+
+
+backends = {backend.name: backend for backend in (ExactBackend, MatmulBackend, IVFBackend, ShardedBackend)}
+
+
+def make_backend(name='exact', **options):
+    """Create a search backend by name ('exact', 'numpy', 'ivf' or 'sharded') with its tuning options."""
+    try:
+        return backends[name](**options)
+    except KeyError:
+        raise ValueError(f"Unknown search backend '{name}', expected one of {sorted(backends)}")
+
+
+def recall_report(backend, reference, targets_scaled, k):
+    """Compare a fitted backend against a fitted reference (normally exact) on the same queries."""
+    start = time.perf_counter()
+    _, reference_indices = reference.query(targets_scaled, k)
+    reference_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _, indices = backend.query(targets_scaled, k)
+    backend_seconds = time.perf_counter() - start
+
+    hits = sum(len(set(found) & set(expected)) for found, expected in zip(indices.tolist(), reference_indices.tolist()))
+    n_queries = len(targets_scaled)
+    return {
+        'backend': backend.name,
+        'reference': reference.name,
+        'k': k,
+        'queries': n_queries,
+        'recall_at_k': hits / float(n_queries * k) if n_queries else 1.0,
+        'backend_ms_per_query': 1000.0 * backend_seconds / max(n_queries, 1),
+        'reference_ms_per_query': 1000.0 * reference_seconds / max(n_queries, 1),
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+    from .recommendation_engine import load_recipes, nutrition_features
+    from sklearn.preprocessing import StandardScaler
+
+    parser = argparse.ArgumentParser(description="Report recall and latency of a search backend against exact search")
+    parser.add_argument('--backend', default='ivf', choices=sorted(backends))
+    parser.add_argument('--options', default='{}', help='JSON object of backend options, e.g. \'{"n_probe": 16}\'')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('-k', type=int, default=6)
+    args = parser.parse_args()
+
+    _, nutrients, _ = load_recipes()
+    X_scaled = StandardScaler().fit_transform(np.asarray(nutrients, dtype=float))
+    rng = np.random.default_rng(0)
+    # Query with perturbed catalog rows so targets resemble real nutrition profiles
+    queries = X_scaled[rng.integers(0, len(X_scaled), args.queries)] + rng.normal(0, 0.1, (args.queries, len(nutrition_features)))
+
+    candidate = make_backend(args.backend, **json.loads(args.options)).fit(X_scaled)
+    exact = make_backend('exact').fit(X_scaled)
+    print(json.dumps(recall_report(candidate, exact, queries, args.k), indent=2))
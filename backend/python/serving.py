@@ -0,0 +1,204 @@
+"""Request-time execution helpers: a bounded work pool, coalescing of identical in-flight
+requests and optional micro-batching of concurrent neighbor queries.
+
+Configured from the environment:
+
+SEARCH_WORKERS       threads running searches and serialization (default min(4, CPUs))
+SEARCH_QUEUE_SIZE    tasks that may wait for a thread; beyond that requests are rejected (default 64)
+REQUEST_TIMEOUT      seconds a request waits for its result (default 10)
+MICROBATCH_WAIT_MS   collect concurrent queries for up to this long into one matrix query (default 0, off)
+MICROBATCH_MAX_ROWS  stop collecting once a batch has this many targets (default 1024)
+MICROBATCH_QUEUE_SIZE  calls that may wait for a batch; beyond that requests are rejected (default 1024)
+"""
+import contextvars
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+import numpy as np
+from . import metrics
+from .recommendation_engine import get_engine, nutrition_features
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    """Raised when the work pool's queue is full."""
+
+
+class WorkPool:
+    """Bounded thread pool for the CPU-heavy part of requests.
+
+    At most ``max_workers`` tasks run at once and ``max_pending`` more may wait. Further
+    submissions raise ``Overloaded`` at once rather than queueing without bound, so a burst
+    is shed quickly instead of raising every request's latency. NumPy and scikit-learn
+    release the GIL while searching, so the threads run in parallel.
+    """
+
+    def __init__(self, max_workers, max_pending, timeout):
+        self.max_workers = int(max_workers)
+        self.max_pending = int(max_pending)
+        self.timeout = float(timeout)
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_pending)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='search')
+        self._lock = threading.Lock()
+        self.in_flight = 0
+
+    def run(self, fn, *args):
+        """Run fn(*args) on the pool and return its result, waiting at most ``timeout`` seconds.
+
+        Raises ``Overloaded`` when the queue is full and ``TimeoutError`` when the result is
+        late; a late task still finishes in the background (and fills the response cache).
+        """
+        if not self._slots.acquire(blocking=False):
+            metrics.registry.inc('inertiafit_rejected_requests_total', 1, 'Requests rejected because the work queue was full')
+            raise Overloaded()
+        with self._lock:
+            self.in_flight += 1
+        try:
+            # Run in a copy of the request's context, so stage timings reach the request
+            future = self._executor.submit(contextvars.copy_context().run, fn, *args)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            metrics.registry.inc('inertiafit_request_timeouts_total', 1, 'Requests that timed out waiting for the work pool')
+            raise
+
+    def _release(self, future):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def collect_metrics(self):
+        return [('inertiafit_work_pool_in_flight', 'gauge', 'Tasks running or queued on the work pool', [({}, self.in_flight)])]
+
+
+class Coalescer:
+    """Runs one computation per key at a time.
+
+    Callers arriving while a computation for their key is in flight wait for it and share
+    its result or exception instead of repeating the work. A key of None always runs.
+    """
+
+    def __init__(self):
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def run(self, key, fn, *args):
+        if key is None:
+            return fn(*args)
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+        if not leader:
+            metrics.registry.inc('inertiafit_coalesced_requests_total', 1, 'Requests answered by an identical in-flight request')
+            return future.result()
+
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+
+class MicroBatcher:
+    """Answers concurrent ``recommend_batch`` calls with one neighbor query.
+
+    The first waiting call opens a batch that collects further calls for up to ``max_wait``
+    seconds or ``max_rows`` targets. The batch is searched once for the largest ``top_n``
+    asked for, and each caller gets its own rows trimmed to its ``top_n``.
+
+    Searches run on the batcher's own thread, and callers wait on theirs. Call it from
+    request threads rather than from the work pool: pool threads would cap a batch at
+    ``SEARCH_WORKERS`` calls. Like the pool, it rejects calls with ``Overloaded`` once
+    ``max_pending`` are waiting, and raises ``TimeoutError`` after ``timeout`` seconds.
+    """
+
+    def __init__(self, max_wait, max_rows=1024, max_pending=1024, timeout=10):
+        self.max_wait = float(max_wait)
+        self.max_rows = int(max_rows)
+        self.timeout = float(timeout)
+        self._slots = threading.BoundedSemaphore(int(max_pending))
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _ensure_thread(self):
+        # Started lazily, and again in forked workers, because threads do not survive fork
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = queue.SimpleQueue()
+                threading.Thread(target=self._loop, args=(self._queue,), name='microbatcher', daemon=True).start()
+            return self._queue
+
+    def recommend_batch(self, targets, top_n):
+        if not self._slots.acquire(blocking=False):
+            metrics.registry.inc('inertiafit_rejected_requests_total', 1, 'Requests rejected because the work queue was full')
+            raise Overloaded()
+        future = Future()
+        future.add_done_callback(lambda _: self._slots.release())
+        targets = np.asarray(targets, dtype=float).reshape(-1, len(nutrition_features))
+        self._ensure_thread().put((targets, int(top_n), future))
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            metrics.registry.inc('inertiafit_request_timeouts_total', 1, 'Requests that timed out waiting for the work pool')
+            raise
+
+    def _loop(self, requests):
+        while True:
+            batch = [requests.get()]
+            rows = len(batch[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while rows < self.max_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+                rows += len(batch[-1][0])
+            self._run(batch)
+
+    def _run(self, batch):
+        try:
+            targets = np.vstack([item[0] for item in batch])
+            results = get_engine().recommend_batch(targets, max(item[1] for item in batch))
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        metrics.registry.inc('inertiafit_microbatch_queries_total', 1, 'Neighbor queries run by the micro-batcher')
+        metrics.registry.inc('inertiafit_microbatch_requests_total', len(batch), 'Calls answered by micro-batched queries')
+        logger.debug("Micro-batched %d calls into one query of %d targets", len(batch), len(targets))
+        offset = 0
+        for item_targets, top_n, future in batch:
+            future.set_result([recipes[:top_n] for recipes in results[offset:offset + len(item_targets)]])
+            offset += len(item_targets)
+
+
+work_pool = WorkPool(max_workers=os.environ.get('SEARCH_WORKERS', min(4, os.cpu_count() or 1)),
+                     max_pending=os.environ.get('SEARCH_QUEUE_SIZE', 64),
+                     timeout=os.environ.get('REQUEST_TIMEOUT', 10))
+coalescer = Coalescer()
+_microbatch_wait = float(os.environ.get('MICROBATCH_WAIT_MS', 0)) / 1000.0
+micro_batcher = MicroBatcher(_microbatch_wait, os.environ.get('MICROBATCH_MAX_ROWS', 1024),
+                             max_pending=os.environ.get('MICROBATCH_QUEUE_SIZE', 1024),
+                             timeout=os.environ.get('REQUEST_TIMEOUT', 10)) if _microbatch_wait > 0 else None
+
+metrics.registry.register_collector(work_pool.collect_metrics)
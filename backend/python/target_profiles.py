@@ -0,0 +1,46 @@
+import os
+import numpy as np
+
+# Share of meal calories from each macro as (low, high) ranges, with kcal per gram
+protein_range = (0.25, 0.35)  # 25-35% of calories from protein
+carbs_range = (0.45, 0.65)    # 45-65% of calories from carbs
+fat_range = (0.20, 0.35)      # 20-35% of calories from fat
+
+# 'midpoint' is deterministic; 'random' samples each range, reproducibly when seeded
+TARGET_PROFILE_MODE = os.environ.get('TARGET_PROFILE_MODE', 'midpoint')
+
+
+def _sample(rng, low, high):
+    # Midpoint of the range without a generator, otherwise a uniform draw
+    return (low + high) / 2 if rng is None else rng.uniform(low, high)
+
+
+def build_target_nutrition(meal_calories, seed=None, mode=None):
+    """Return an (n, 9) matrix of target nutrition profiles, one row per meal calorie value.
+
+    In 'midpoint' mode (the default) identical inputs always give identical targets. A
+    ``seed`` switches to sampling within the macro ranges with a generator seeded from it,
+    so the same seed still reproduces the same targets. 'random' mode without a seed
+    samples freshly on every call.
+    """
+    mode = mode or TARGET_PROFILE_MODE
+    meal_calories = np.asarray(meal_calories, dtype=float).reshape(-1)
+    rng = np.random.default_rng(seed) if seed is not None or mode == 'random' else None
+
+    # Generate target nutrition profile based on meal calories
+    protein_target = _sample(rng, meal_calories * protein_range[0] / 4, meal_calories * protein_range[1] / 4)
+    carbs_target = _sample(rng, meal_calories * carbs_range[0] / 4, meal_calories * carbs_range[1] / 4)
+    fat_target = _sample(rng, meal_calories * fat_range[0] / 9, meal_calories * fat_range[1] / 9)
+
+    # Convert macros to approximations of other nutrition values
+    return np.column_stack([
+        meal_calories,                          # Calories
+        fat_target,                             # FatContent (g)
+        fat_target * 0.3,                       # SaturatedFatContent (g) - ~30% of fat
+        protein_target * 3,                     # CholesterolContent (mg) - rough approximation
+        meal_calories * 0.2,                    # SodiumContent (mg) - rough approximation
+        carbs_target,                           # CarbohydrateContent (g)
+        carbs_target * 0.15,                    # FiberContent (g) - ~15% of carbs
+        carbs_target * 0.2,                     # SugarContent (g) - ~20% of carbs
+        protein_target                          # ProteinContent (g)
+    ])
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+import pytest
+import app as api_app
+from python.ingredients import IngredientIndex
+from python.recipe_columns import RecipeColumns
+from python.recommendation_engine import (RecommendationEngine, get_engine, id_column, ingredient_column,
+                                          metadata_columns, nutrition_features, set_engine)
+from python.response_cache import response_cache
+from python.search_backends import MatmulBackend
+
+# Nutrition values the synthetic recipes are spread around
+target = [400, 10, 3, 50, 300, 40, 5, 10, 30]
+
+
+@pytest.fixture
+def client():
+    # 200 recipes, of which the first 20 use saffron
+    rng = np.random.default_rng(0)
+    n = 200
+    df = pd.DataFrame({
+        id_column: [str(i) for i in range(n)],
+        'Name': [f'Recipe {i}' for i in range(n)],
+        ingredient_column: ['c("saffron", "rice")' if i < 20 else 'c("salt", "rice")' for i in range(n)],
+        **{feature: rng.uniform(1, 2 * value + 1, n).round(1) for feature, value in zip(nutrition_features, target)},
+    })
+    previous = get_engine()
+    set_engine(RecommendationEngine(RecipeColumns.from_frame(df, metadata_columns), df[nutrition_features].to_numpy(dtype=float),
+                                    IngredientIndex.from_values(df[ingredient_column]), backend=MatmulBackend()))
+    response_cache.clear()
+    yield api_app.app.test_client()
+    set_engine(previous)
+    response_cache.clear()
@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+import pytest
+from python.catalog import CatalogEngine, apply_changes
+from python.ingredients import IngredientIndex
+from python.recipe_columns import RecipeColumns
+from python.recommendation_engine import (RecommendationEngine, id_column, ingredient_column, metadata_columns,
+                                          nutrition_features)
+from python.search_backends import MatmulBackend
+
+ingredient_lists = ['c("sugar", "butter")', 'c("eggs", "flour")', 'c("cream cheese", "sugar")', 'c("chicken", "salt")']
+
+
+def recipe(recipe_id, rng, ingredients=('salt', 'pepper')):
+    values = dict(zip(nutrition_features, rng.uniform(1, 100, len(nutrition_features)).round(1)))
+    return dict(values, RecipeId=str(recipe_id), Name=f'Recipe {recipe_id}', RecipeIngredientParts=list(ingredients))
+
+
+def make_engine(n=200, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        id_column: [str(i) for i in range(n)],
+        'Name': [f'Recipe {i}' for i in range(n)],
+        ingredient_column: [ingredient_lists[i % len(ingredient_lists)] for i in range(n)],
+        **{feature: rng.uniform(1, 100, n).round(1) for feature in nutrition_features},
+    })
+    return RecommendationEngine(RecipeColumns.from_frame(df, metadata_columns), df[nutrition_features].to_numpy(dtype=float),
+                                IngredientIndex.from_values(df[ingredient_column]), backend=MatmulBackend())
+
+
+def ids(engine, rows):
+    return [record['Name'] for record in engine.records(rows)]
+
+
+def test_updates_do_not_refit_the_base():
+    base = make_engine()
+    rng = np.random.default_rng(1)
+    engine = apply_changes(base, [{'op': 'upsert', 'recipes': [recipe('new', rng), recipe('5', rng)]},
+                                  {'op': 'remove', 'ids': ['7', '8']}])
+    assert isinstance(engine, CatalogEngine)
+    assert engine.base is base
+    assert engine.added.scaler is base.scaler
+    assert len(engine) == 200 - 3 + 2
+    assert np.flatnonzero(engine.removed).tolist() == [5, 7, 8]
+
+
+def test_search_matches_a_single_engine_over_the_live_recipes():
+    base = make_engine()
+    rng = np.random.default_rng(2)
+    engine = apply_changes(base, [{'op': 'upsert', 'recipes': [recipe(f'new{i}', rng) for i in range(20)]},
+                                  {'op': 'remove', 'ids': [str(i) for i in range(0, 200, 3)]}])
+    # The same live rows in one engine, scaled by the same fitted scaler
+    keep = np.flatnonzero(~engine.removed)
+    reference = RecommendationEngine(base.metadata.select(keep).appended(engine.added.metadata),
+                                     np.concatenate([base.nutrients[keep], engine.added.nutrients]),
+                                     base.ingredients.select(keep).extended(engine.added.ingredients),
+                                     backend=MatmulBackend(), scaler=base.scaler)
+
+    targets = np.random.default_rng(3).uniform(1, 100, (5, len(nutrition_features)))
+    distances, rows = engine.search(targets, 10)
+    expected_distances, expected_rows = reference.search(targets, 10)
+    np.testing.assert_allclose(distances, expected_distances, rtol=1e-5)
+    assert [ids(engine, row) for row in rows] == [ids(reference, row) for row in expected_rows]
+    assert engine.nutrient_values(rows[0]).tolist() == reference.nutrient_values(expected_rows[0]).tolist()
+
+
+def test_many_removals_use_a_row_subset(monkeypatch):
+    monkeypatch.setattr('python.catalog.MAX_OVERFETCH', 5)
+    engine = apply_changes(make_engine(), [{'op': 'remove', 'ids': [str(i) for i in range(150)]}])
+    _, rows = engine.search(np.full((2, len(nutrition_features)), 50.0), 60)
+    assert rows.shape == (2, 50)
+    assert not engine.removed[rows].any()
+
+
+def test_candidate_mask_covers_added_recipes_and_skips_removed():
+    rng = np.random.default_rng(4)
+    engine = apply_changes(make_engine(), [{'op': 'upsert', 'recipes': [recipe('new', rng, ['cream cheese'])]},
+                                           {'op': 'remove', 'ids': ['2']}])
+    mask = engine.candidate_mask(['cream cheese'])
+    assert len(mask) == 200 + 1
+    assert mask[-1] and not mask[2] and mask[6]
+    _, rows = engine.search(np.full((1, len(nutrition_features)), 50.0), 100, mask)
+    assert 'Recipe new' in ids(engine, rows[0])
+    assert rows.shape[1] == mask.sum()
+
+
+def test_changes_build_on_earlier_changes():
+    rng = np.random.default_rng(5)
+    engine = apply_changes(make_engine(), [{'op': 'upsert', 'recipes': [recipe('a', rng), recipe('b', rng)]}])
+    engine = apply_changes(engine, [{'op': 'remove', 'ids': ['a']}, {'op': 'upsert', 'recipes': [recipe('b', rng)]}])
+    assert engine.added.metadata[id_column].take(range(len(engine.added))) == ['b']
+    assert len(engine) == 201
+
+
+def test_compacted_refits_the_same_catalog():
+    rng = np.random.default_rng(6)
+    engine = apply_changes(make_engine(), [{'op': 'upsert', 'recipes': [recipe('new', rng, ['saffron'])]},
+                                           {'op': 'remove', 'ids': ['0', '1']}])
+    assert engine.drift() == pytest.approx(3 / 200)
+    compacted = engine.compacted()
+    assert compacted.drift() == 0
+    assert len(compacted) == len(engine) == 199
+    assert compacted.base.metadata[id_column].take(range(len(compacted)))[-1] == 'new'
+    assert compacted.candidate_mask(['saffron']).sum() == 1
+
+
+def test_changes_to_an_empty_catalog():
+    empty = RecommendationEngine(RecipeColumns.empty(metadata_columns), np.empty((0, len(nutrition_features))),
+                                 IngredientIndex.empty())
+    engine = apply_changes(empty, [{'op': 'upsert', 'recipes': [recipe(i, np.random.default_rng(i)) for i in range(3)]}])
+    assert len(engine) == 3
+    assert engine.search(np.full((1, len(nutrition_features)), 50.0), 5)[1].shape == (1, 3)
+
+
+def test_explain_a_result_of_added_recipes_only():
+    rng = np.random.default_rng(7)
+    added = [recipe(f'new{i}', rng) for i in range(3)]
+    engine = apply_changes(make_engine(), [{'op': 'upsert', 'recipes': added}])
+    target = [added[0][feature] for feature in nutrition_features]
+    candidates = np.concatenate([np.zeros(200, dtype=bool), np.ones(3, dtype=bool)])
+    results = engine.recommend(target, 3, candidates, explain=True)
+    assert [record['Name'] for record in results][0] == 'Recipe new0'
+    assert results[0]['distance'] == pytest.approx(0, abs=1e-6)
+    assert all(delta == pytest.approx(0, abs=1e-3) for delta in results[0]['nutrient_deltas'].values())
+    assert all('nutrient_deltas' in record for record in results)
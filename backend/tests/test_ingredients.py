@@ -0,0 +1,74 @@
+import numpy as np
+from python.ingredients import IngredientIndex, InvertedIngredientIndex, parse_ingredient_query
+
+# RecipeIngredientParts as stored in recipes.csv
+recipes = [
+    'c("sour cream", "cheddar cheese")',
+    'c("cream cheese", "sugar")',
+    'c("peanut oil", "butter")',
+    'c("peanut butter", "bread")',
+    'c("brown sugar", "eggs")',
+]
+
+
+def build_index(values=recipes):
+    return InvertedIngredientIndex(IngredientIndex.from_values(values))
+
+
+def matching(mask):
+    return np.flatnonzero(mask).tolist()
+
+
+def test_phrase_tokens_must_share_one_ingredient():
+    index = build_index()
+    assert matching(index.phrase_mask('cream cheese')) == [1]
+    assert matching(index.phrase_mask('peanut butter')) == [3]
+
+
+def test_single_token_matches_every_ingredient_containing_it():
+    index = build_index()
+    assert matching(index.phrase_mask('cheese')) == [0, 1]
+    assert matching(index.phrase_mask('sugar')) == [1, 4]
+
+
+def test_phrase_matching_ignores_case_order_and_plurals():
+    index = build_index()
+    assert matching(index.phrase_mask('Cheese Cream')) == [1]
+    assert matching(index.phrase_mask('egg')) == [4]
+
+
+def test_unknown_phrase_matches_nothing():
+    index = build_index()
+    assert matching(index.phrase_mask('saffron')) == []
+    assert matching(index.phrase_mask('cream saffron')) == []
+
+
+def test_candidate_mask_combines_required_and_excluded_phrases():
+    index = build_index()
+    assert index.candidate_mask() is None
+    assert matching(index.candidate_mask(excluded=['peanut butter'])) == [0, 1, 2, 4]
+    assert matching(index.candidate_mask(required=['cream'], excluded=['cheddar cheese'])) == [1]
+    assert matching(index.candidate_mask(required=parse_ingredient_query('sugar; egg'))) == [4]
+
+
+def test_index_after_select_and_append():
+    ingredients = IngredientIndex.from_values(recipes).select([4, 2]).appended(['"cream cheese"'])
+    index = InvertedIngredientIndex(ingredients)
+    assert matching(index.phrase_mask('butter')) == [1]
+    assert matching(index.phrase_mask('cream cheese')) == [2]
+
+
+def test_empty_index():
+    index = build_index([])
+    assert matching(index.phrase_mask('cheese')) == []
+
+
+def test_list_values_are_parsed_one_by_one():
+    index = IngredientIndex.from_values([['sugar', 'butter'], ['eggs'], None, ['sugar']])
+    assert [index.ingredients(row) for row in range(4)] == [['sugar', 'butter'], ['eggs'], [], ['sugar']]
+
+
+def test_extended_interns_names_into_the_vocabulary():
+    index = IngredientIndex.from_values(['c("sugar", "butter")']).extended(IngredientIndex.from_values([['eggs', 'sugar']]))
+    assert index.vocabulary == ['sugar', 'butter', 'eggs']
+    assert [index.ingredients(row) for row in range(2)] == [['sugar', 'butter'], ['eggs', 'sugar']]
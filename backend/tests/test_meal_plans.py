@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+from python.ingredients import IngredientIndex
+from python.meal_plans import choose_days, plan_meals
+from python.recipe_columns import RecipeColumns
+from python.recommendation_engine import RecommendationEngine, id_column, metadata_columns, nutrition_features
+from python.search_backends import MatmulBackend
+
+macros = {'calories': 2400, 'protein': 84, 'carbs': 330, 'fats': 56}
+meal_calories = {'breakfast': 840, 'lunch': 960, 'dinner': 600}
+
+
+def make_engine(n=3000, seed=0):
+    # Recipes with macros roughly in proportion to their calories
+    rng = np.random.default_rng(seed)
+    calories = rng.uniform(100, 1200, n)
+    protein, carbs, fat = (calories * rng.uniform(low, high, n) / kcal
+                           for low, high, kcal in ((0.1, 0.35, 4), (0.4, 0.7, 4), (0.15, 0.4, 9)))
+    nutrients = np.column_stack([calories, fat, fat * 0.3, protein * 3, calories * 0.2, carbs, carbs * 0.15, carbs * 0.2,
+                                 protein]).round(1)
+    df = pd.DataFrame({id_column: [str(i) for i in range(n)], 'Name': [f'Recipe {i}' for i in range(n)]})
+    return RecommendationEngine(RecipeColumns.from_frame(df, metadata_columns), nutrients,
+                                IngredientIndex.from_values([None] * n), backend=MatmulBackend())
+
+
+def test_long_plan_keeps_the_full_window():
+    plan = plan_meals(make_engine(), macros, meal_calories, days=28)
+    names = [recipe['Name'] for day in plan for recipe in day['meals'].values()]
+    assert len(plan) == 28
+    assert len(set(names)) == len(names) == 84
+    assert all(day['repeats'] == 0 for day in plan)
+
+
+def test_days_are_searched_again_without_recent_recipes():
+    # Every combination uses recipe 1, so the second day needs the rerank
+    combinations = np.array([[1, 2], [1, 3]])
+    reranked = np.array([[4, 5]])
+    excluded = []
+
+    def rerank(rows):
+        excluded.append(sorted(rows.tolist()))
+        return reranked, np.array([0.5])
+
+    chosen, scores, repeats = choose_days(combinations, np.array([0.1, 0.2]), 2, 2, rerank)
+    assert chosen.tolist() == [[1, 2], [4, 5]]
+    assert scores.tolist() == [0.1, 0.5]
+    assert repeats == [0, 0]
+    assert excluded == [[1, 2]]
+
+
+def test_repeats_are_reported_when_no_combination_avoids_them():
+    combinations = np.array([[1, 2], [1, 3]])
+    chosen, _, repeats = choose_days(combinations, np.array([0.1, 0.2]), 3, 3,
+                                     lambda rows: (np.empty((0, 2), dtype=int), np.empty(0)))
+    assert chosen.tolist() == [[1, 2], [1, 3], [1, 2]]
+    assert repeats == [0, 1, 2]
@@ -0,0 +1,52 @@
+import app as api_app
+from conftest import target
+from python.request_schema import custom_cursor_schema, encode_cursor
+
+
+def custom(client, **body):
+    response = client.post('/api/custom-nutrition', json=body)
+    return response.status_code, response.get_json()
+
+
+def pages(client, **body):
+    status, page = custom(client, nutrition_values_list=target, paginate=True, **body)
+    assert status == 200
+    result = [page]
+    while page['next_cursor'] is not None:
+        status, page = custom(client, cursor=page['next_cursor'])
+        assert status == 200
+        result.append(page)
+    return result
+
+
+def names(recipes):
+    return [recipe['Name'] for recipe in recipes]
+
+
+def test_cursor_round_trip_matches_the_unpaginated_ranking(client):
+    result = pages(client, nb_recommendations=6, ingredient_txt='saffron')
+    assert [len(page['recipes']) for page in result] == [6, 6, 6, 2]
+    status, expected = custom(client, nutrition_values_list=target, nb_recommendations=20, ingredient_txt='saffron')
+    assert status == 200
+    assert sum((names(page['recipes']) for page in result), []) == names(expected)
+
+
+def test_page_past_the_end_with_explain(client):
+    state = custom_cursor_schema.validate({'nutrition_values_list': target, 'nb_recommendations': 5,
+                                           'ingredient_txt': 'saffron', 'explain': True})
+    status, page = custom(client, cursor=encode_cursor(custom_cursor_schema, state, offset=50))
+    assert (status, page) == (200, {'recipes': [], 'next_cursor': None})
+
+
+def test_ranking_of_exactly_the_search_depth(client, monkeypatch):
+    # 20 matches fill a depth-20 ranking, so the last full page still gets a cursor,
+    # and the page after it searches deeper and comes back empty
+    monkeypatch.setattr(api_app, 'RANKING_DEPTH', 20)
+    result = pages(client, nb_recommendations=10, ingredient_txt='saffron', explain=True)
+    assert [len(page['recipes']) for page in result] == [10, 10, 0]
+    assert all('nutrient_deltas' in recipe for page in result for recipe in page['recipes'])
+
+
+def test_empty_first_page_is_not_found(client):
+    status, body = custom(client, nutrition_values_list=target, paginate=True, ingredient_txt='truffle')
+    assert status == 404
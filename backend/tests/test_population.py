@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from app import Person
+from python.population import activity_levels, calculate_population, meal_calories
+
+activities = activity_levels + ['moderate exercise (3-5 days/week)', 'VERY HEAVY EXERCISE', 'couch', '']
+goals = ['Lose', 'Maintain', 'Gain', 'lose', 'bulk', '']
+genders = ['Male', 'Female', 'male', 'other']
+
+
+def random_profiles(n, seed):
+    rng = np.random.default_rng(seed)
+    height = rng.integers(50, 273, n)
+    scale = 10.0 ** rng.integers(0, 4, n)
+    weight = np.round(rng.uniform(2, 650, n) * scale) / scale
+    # Weights whose BMI lands within a rounding error of a half hundredth, where
+    # np.round and round() can disagree
+    ties = rng.random(n) < 0.3
+    weight[ties] = ((rng.integers(1000, 9000, ties.sum()) + 0.5) / 100) * (height[ties] / 100) ** 2
+    return {
+        'age': rng.integers(1, 121, n),
+        'height': height,
+        'weight': weight,
+        'gender': np.array(genders)[rng.integers(0, len(genders), n)],
+        'activity': np.array(activities)[rng.integers(0, len(activities), n)],
+        'goal': np.array(goals)[rng.integers(0, len(goals), n)],
+    }
+
+
+def profiles_row(profiles, i):
+    return {name: values[i] for name, values in profiles.items()}
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_population_matches_person(seed):
+    profiles = random_profiles(10000, seed)
+    results = calculate_population(**profiles)
+    meals = meal_calories(results['calories'])
+    for i in range(len(profiles['age'])):
+        person = Person(int(profiles['age'][i]), int(profiles['height'][i]), float(profiles['weight'][i]),
+                        str(profiles['gender'][i]), str(profiles['activity'][i]), str(profiles['goal'][i]))
+        bmi, category = person.display_result()
+        macros = person.calculate_macros()
+        expected = dict(macros, bmi=bmi, category=category, bmr=person.calculate_bmr(), tdee=person.calories_calculator())
+        assert {name: results[name][i] for name in expected} == expected, profiles_row(profiles, i)
+        assert {meal: values[i] for meal, values in meals.items()} == person.meal_calories(macros)
+
+
+def test_near_ties_round_like_python():
+    # At height 100 the BMI is the weight. 10.025 is stored just above the half and
+    # 10.055 just below, so round() gives 10.03 and 10.05 where np.round gives 10.02
+    # and 10.06
+    height = np.array([100, 100, 100])
+    weight = np.array([10.025, 10.055, 10.135])
+    assert calculate_population(np.full(3, 30), height, weight, np.full(3, 'Male'), np.zeros(3, dtype=int),
+                                np.ones(3, dtype=int))['bmi'].tolist() == [10.03, 10.05, 10.13]
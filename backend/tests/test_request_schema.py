@@ -0,0 +1,126 @@
+import pytest
+from python.request_schema import (MAX_BATCH_PROFILES, ValidationError, batch_schema, custom_cursor_schema,
+                                   custom_next_page_schema, custom_schema, encode_cursor, meal_plan_schema,
+                                   nutrition_schema)
+
+nutrition_values = [400, 10, 3, 50, 300, 40, 5, 10, 30]
+
+
+def rejected(schema, data):
+    with pytest.raises(ValidationError) as info:
+        schema.validate(data)
+    return info.value.field, info.value.message
+
+
+def test_defaults_fill_missing_and_null_fields():
+    values = nutrition_schema.validate({'weight': None})
+    assert values == {'age': 30, 'height': 170, 'weight': 70.0, 'gender': 'Male', 'activityLevel': 'Little/no exercise',
+                      'weightGoal': 'Maintain', 'seed': None, 'explain': False}
+
+
+def test_numbers_are_coerced_and_truncated():
+    values = nutrition_schema.validate({'age': '42', 'height': 180.9, 'weight': ' 81.5 '})
+    assert (values['age'], values['height'], values['weight']) == (42, 180, 81.5)
+    assert type(values['weight']) is float
+
+
+@pytest.mark.parametrize('data, field, message', [
+    ({'age': True}, 'age', '"age" must be a number'),
+    ({'age': 'forty'}, 'age', '"age" must be a number'),
+    ({'age': [30]}, 'age', '"age" must be a number'),
+    ({'weight': 'nan'}, 'weight', '"weight" must be a finite number'),
+    ({'weight': 'inf'}, 'weight', '"weight" must be a finite number'),
+    ({'age': 0}, 'age', '"age" must be between 1 and 120'),
+    ({'height': 300}, 'height', '"height" must be between 50 and 272'),
+    ({'seed': -1}, 'seed', '"seed" must be between 0 and 9223372036854775807'),
+    ({'gender': 5}, 'gender', '"gender" must be a string'),
+    ({'gender': 'x' * 101}, 'gender', '"gender" must be at most 100 characters'),
+    ({'explain': 'yes'}, 'explain', '"explain" must be true or false'),
+])
+def test_invalid_profile_fields(data, field, message):
+    assert rejected(nutrition_schema, data) == (field, message)
+
+
+def test_non_objects_are_rejected():
+    assert rejected(nutrition_schema, None) == (None, 'Expected a JSON object')
+    assert rejected(nutrition_schema, [1, 2]) == (None, 'Expected a JSON object')
+
+
+def test_enumerations_are_normalized():
+    values = nutrition_schema.validate({'activityLevel': 'MODERATE EXERCISE (3-5 days/week)', 'weightGoal': 'gain',
+                                        'gender': ' Male '})
+    assert (values['activityLevel'], values['weightGoal'], values['gender']) == ('Moderate exercise', 'Gain', 'Male')
+    # Unknown labels fall back, as Person always did
+    values = nutrition_schema.validate({'activityLevel': 'couch', 'weightGoal': 'bulk'})
+    assert (values['activityLevel'], values['weightGoal']) == ('Little/no exercise', 'Maintain')
+
+
+def test_equivalent_payloads_share_a_key():
+    first = nutrition_schema.validate({'age': '30', 'weightGoal': 'maintain', 'activityLevel': 'little/no exercise'})
+    assert nutrition_schema.key(first) == nutrition_schema.key(nutrition_schema.validate({}))
+
+
+def test_repeat_window_defaults_to_days():
+    assert meal_plan_schema.validate({'days': 5})['repeat_window'] == 5
+    assert rejected(meal_plan_schema, {'days': 29}) == ('days', '"days" must be between 1 and 28')
+    assert rejected(meal_plan_schema, {'repeat_window': 0}) == ('repeat_window', '"repeat_window" must be at least 1')
+
+
+def test_batch_profiles_are_validated_with_their_position():
+    assert rejected(batch_schema, {}) == ('profiles', '"profiles" is required')
+    assert rejected(batch_schema, {'profiles': {}}) == ('profiles', 'Expected a "profiles" list of objects')
+    assert rejected(batch_schema, {'profiles': [{}, 'x']}) == ('profiles[1]', '"profiles[1]" must be an object')
+    assert rejected(batch_schema, {'profiles': [{}, {'age': -3}]}) == \
+        ('profiles[1].age', '"profiles[1].age" must be between 1 and 120')
+    assert rejected(batch_schema, {'profiles': [{}] * (MAX_BATCH_PROFILES + 1)})[0] == 'profiles'
+
+
+def test_custom_nutrition_values_and_ingredient_filters():
+    values = custom_schema.validate({'nutrition_values_list': nutrition_values,
+                                     'ingredient_txt': 'Eggs; brown sugar, eggs', 'excluded_ingredients': ['Peanuts', '']})
+    assert values['nutrition_values_list'] == tuple(float(value) for value in nutrition_values)
+    assert values['ingredient_txt'] == ('brown sugar', 'eggs')
+    assert values['excluded_ingredients'] == ('peanuts',)
+    assert custom_schema.key(values) == custom_schema.key(custom_schema.validate(
+        {'nutrition_values_list': nutrition_values, 'ingredient_txt': ['eggs', 'Brown Sugar'],
+         'excluded_ingredients': 'peanuts'}))
+
+
+@pytest.mark.parametrize('data, field, message', [
+    ({}, 'nutrition_values_list', '"nutrition_values_list" is required'),
+    ({'nutrition_values_list': [1, 2]}, 'nutrition_values_list', '"nutrition_values_list" must be a list of 9 numbers'),
+    ({'nutrition_values_list': nutrition_values[:8] + [-1]}, 'nutrition_values_list[8]',
+     '"nutrition_values_list[8]" must be at least 0'),
+    ({'nutrition_values_list': nutrition_values, 'ingredient_txt': 5}, 'ingredient_txt',
+     '"ingredient_txt" must be a string or a list of strings'),
+    ({'nutrition_values_list': nutrition_values, 'ingredient_txt': ['eggs', 3]}, 'ingredient_txt',
+     '"ingredient_txt" must be a string or a list of strings'),
+    ({'nutrition_values_list': nutrition_values, 'ingredient_txt': [f'item {i}' for i in range(51)]}, 'ingredient_txt',
+     '"ingredient_txt" may list at most 50 ingredients'),
+    ({'nutrition_values_list': nutrition_values, 'nb_recommendations': 101}, 'nb_recommendations',
+     '"nb_recommendations" must be between 1 and 100'),
+])
+def test_invalid_custom_requests(data, field, message):
+    assert rejected(custom_schema, data) == (field, message)
+
+
+def test_cursor_round_trip():
+    values = custom_cursor_schema.validate({'nutrition_values_list': nutrition_values, 'ingredient_txt': 'eggs'})
+    cursor = encode_cursor(custom_cursor_schema, values, offset=12)
+    assert custom_next_page_schema.validate({'cursor': cursor})['cursor'] == dict(values, offset=12)
+
+
+@pytest.mark.parametrize('cursor', ['not a cursor!', 'e30', encode_cursor(custom_cursor_schema, {
+    'nutrition_values_list': nutrition_values, 'nb_recommendations': 6, 'ingredient_txt': (),
+    'excluded_ingredients': (), 'explain': False, 'offset': 5000})])
+def test_invalid_cursors(cursor):
+    assert rejected(custom_next_page_schema, {'cursor': cursor}) == ('cursor', '"cursor" is not a valid cursor')
+
+
+def test_api_answers_400_with_the_field(client):
+    response = client.post('/api/nutrition', json={'age': 'old'})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': '"age" must be a number', 'field': 'age'}
+    response = client.post('/api/custom-nutrition', data='not json', content_type='application/json')
+    assert response.status_code == 400
+    assert response.get_json()['field'] is None
@@ -0,0 +1,24 @@
+import pytest
+from python import target_profiles
+from python.response_cache import ResponseCache, response_cache
+
+
+def test_none_keys_are_never_cached():
+    cache = ResponseCache(maxsize=10)
+    cache.set(None, 'value')
+    assert cache.get(None) is None
+    assert cache.stats()['size'] == 0
+
+
+@pytest.mark.parametrize('path, body', [('/api/nutrition', {}), ('/api/meal-plan', {'days': 2}),
+                                        ('/api/nutrition/batch', {'profiles': [{}]})])
+def test_unseeded_random_targets_are_not_cached(client, monkeypatch, path, body):
+    monkeypatch.setattr(target_profiles, 'TARGET_PROFILE_MODE', 'random')
+    assert client.post(path, json=body).status_code == 200
+    assert response_cache.stats()['size'] == 0
+
+    # A seed makes the sampled targets reproducible, so those responses are cached
+    seeded = {'profiles': [{'seed': 7}]} if 'profiles' in body else dict(body, seed=7)
+    first = client.post(path, json=seeded).get_json()
+    assert response_cache.stats()['size'] == 1
+    assert client.post(path, json=seeded).get_json() == first
@@ -0,0 +1,17 @@
+import numpy as np
+from python.search_backends import ExactBackend, MatmulBackend
+
+
+def test_exact_backend_keeps_no_normalized_copy():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(500, 9)).astype(np.float32)
+    exact, matmul = ExactBackend().fit(X), MatmulBackend().fit(X)
+    assert not hasattr(exact, 'X_normalized')
+
+    targets = rng.normal(size=(4, 9))
+    rows = np.flatnonzero(rng.random(500) < 0.3)
+    for subset in (rows, None):
+        distances, indices = exact.query(targets, 10, subset)
+        expected_distances, expected_indices = matmul.query(targets, 10, subset)
+        assert indices.tolist() == expected_indices.tolist()
+        np.testing.assert_allclose(distances, expected_distances, atol=1e-5)
@@ -0,0 +1,61 @@
+import threading
+import numpy as np
+import pytest
+from python import serving
+from python.serving import MicroBatcher, Overloaded
+
+
+class RecordingEngine:
+    """Answers each target with its own first value, and records the size of every query."""
+
+    def __init__(self, delay=None):
+        self.queries = []
+        self.delay = delay
+        self.started = threading.Event()
+
+    def recommend_batch(self, targets, top_n):
+        self.started.set()
+        if self.delay is not None:
+            self.delay.wait()
+        self.queries.append(len(targets))
+        return [[{'target': target[0], 'rank': rank} for rank in range(top_n)] for target in targets]
+
+
+def test_concurrent_calls_share_queries(monkeypatch):
+    engine = RecordingEngine()
+    monkeypatch.setattr(serving, 'get_engine', lambda: engine)
+    batcher = MicroBatcher(max_wait=0.2)
+    results = [None] * 40
+    start = threading.Barrier(len(results))
+
+    def call(i):
+        start.wait()
+        results[i] = batcher.recommend_batch(np.full((3, 9), float(i)), top_n=1 + i % 3)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(len(results))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(engine.queries) == 3 * len(results)
+    assert len(engine.queries) < len(results) / 4
+    for i, result in enumerate(results):
+        assert [[recipe['target'] for recipe in recipes] for recipes in result] == [[i] * (1 + i % 3)] * 3
+
+
+def test_full_queue_is_rejected(monkeypatch):
+    release = threading.Event()
+    engine = RecordingEngine(release)
+    monkeypatch.setattr(serving, 'get_engine', lambda: engine)
+    batcher = MicroBatcher(max_wait=0.01, max_pending=1)
+    waiting = threading.Thread(target=batcher.recommend_batch, args=(np.zeros((1, 9)), 1))
+    waiting.start()
+    try:
+        # The first call holds the only slot while its query runs
+        assert engine.started.wait(5)
+        with pytest.raises(Overloaded):
+            batcher.recommend_batch(np.zeros((1, 9)), 1)
+    finally:
+        release.set()
+        waiting.join()